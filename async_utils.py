@@ -1,31 +1,162 @@
-import os
+import time
 import queue
+import threading
 from tkinter import messagebox
-from concurrent.futures import ThreadPoolExecutor
+
+from scheduler import get_scheduler, INTERACTIVE, BACKGROUND, BULK
+
+class TaskCancelled(Exception):
+    pass
+
+class Task:
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, engine, channel=None, generation=0, on_progress=None):
+        self.engine = engine
+        self.channel = channel
+        self.generation = generation
+        self.on_progress = on_progress
+        self._cancel = threading.Event()
+        self._started = time.monotonic()
+        self._last_progress = 0.0
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set() or not self.engine.is_current(self)
+
+    def check(self):
+        if self.cancelled: raise TaskCancelled()
+
+    def progress(self, done, total, done_bytes=0, total_bytes=0):
+        self.check()
+        if self.on_progress is None: return
+        now = time.monotonic()
+        if done < total and now - self._last_progress < self.PROGRESS_INTERVAL: return
+        self._last_progress = now
+        elapsed = now - self._started
+        frac = done_bytes / total_bytes if total_bytes else (done / total if total else 1.0)
+        info = {
+            "done": done, "total": total, "bytes": done_bytes, "total_bytes": total_bytes,
+            "fraction": frac, "elapsed": elapsed,
+            "eta": elapsed * (1 - frac) / frac if frac > 0 else None
+        }
+        self.engine.post(self._deliver, info, key=("progress", id(self)))
+
+    def _deliver(self, info):
+        if not self.cancelled: self.on_progress(info)
 
 class AsyncEngine:
+    WAKE_EVENT = "<<AsyncEngineWake>>"
+    SAFETY_TICK = 100
+
     def __init__(self, ui_callback_target):
-        workers = (os.cpu_count() or 4) * 4
-        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.scheduler = get_scheduler()
         self.ui_target = ui_callback_target
         self.msg_queue = queue.Queue()
+        self._generations = {}
+        self._current = {}
+        self._keyed = {}
+        self._lock = threading.Lock()
+        self._wake_pending = False
+        self._wake_enabled = False
+        self._tick_scheduled = False
+        self._inflight = 0
+        self.ui_target.bind(self.WAKE_EVENT, lambda e: self._check_queue(), add="+")
+        self._schedule_tick()
+
+    def _schedule_tick(self):
+        if self._tick_scheduled: return
+        self._tick_scheduled = True
+        self.ui_target.after(self.SAFETY_TICK, self._on_tick)
+
+    def _on_tick(self):
+        self._tick_scheduled = False
+        self._wake_enabled = True
         self._check_queue()
 
     def _check_queue(self):
+        with self._lock:
+            self._wake_pending = False
         try:
             while True:
-                task = self.msg_queue.get_nowait()
-                task()
+                item = self.msg_queue.get_nowait()
+                if isinstance(item, tuple):
+                    with self._lock:
+                        item = self._keyed.pop(item[1], None)
+                    if item is None: continue
+                item()
         except queue.Empty:
             pass
-        self.ui_target.after(10, self._check_queue)
+        if self._inflight > 0: self._schedule_tick()
+
+    def _wake(self):
+        with self._lock:
+            if self._wake_pending or not self._wake_enabled: return
+            self._wake_pending = True
+        try:
+            self.ui_target.event_generate(self.WAKE_EVENT, when="tail")
+        except Exception:
+            with self._lock:
+                self._wake_pending = False
+
+    def post(self, func, *args, key=None):
+        if key is None:
+            self.msg_queue.put(lambda: func(*args))
+        else:
+            with self._lock:
+                queued = key in self._keyed
+                self._keyed[key] = lambda: func(*args)
+            if queued: return
+            self.msg_queue.put(("key", key))
+        self._wake()
+
+    def is_current(self, task):
+        return task.channel is None or self._generations.get(task.channel) == task.generation
+
+    def cancel(self, channel):
+        task = self._current.get(channel)
+        if task is not None: task.cancel()
+
+    def run(self, func, callback, *args, channel=None, priority=INTERACTIVE, on_progress=None,
+            on_cancel=None, on_error=None, with_task=False):
+        generation = 0
+        if channel is not None:
+            self.cancel(channel)
+            generation = self._generations.get(channel, 0) + 1
+            self._generations[channel] = generation
+        task = Task(self, channel, generation, on_progress)
+        if channel is not None: self._current[channel] = task
+        self._inflight += 1
+
+        def finish(res):
+            self._inflight -= 1
+            if task.cancelled:
+                if on_cancel: on_cancel()
+                return
+            callback(res)
+
+        def cancelled():
+            self._inflight -= 1
+            if on_cancel: on_cancel()
+
+        def failed(err_msg):
+            self._inflight -= 1
+            if on_error: on_error(err_msg)
+            messagebox.showerror("错误", err_msg)
 
-    def run(self, func, callback, *args):
         def wrapper():
             try:
-                res = func(*args)
-                self.msg_queue.put(lambda: callback(res))
+                task.check()
+                res = func(task, *args) if with_task else func(*args)
+                self.post(finish, res)
+            except TaskCancelled:
+                self.post(cancelled)
             except Exception as e:
-                err_msg = str(e)
-                self.msg_queue.put(lambda: messagebox.showerror("错误", err_msg))
-        self.pool.submit(wrapper)
\ No newline at end of file
+                if task.cancelled: self.post(cancelled)
+                else: self.post(failed, str(e))
+        self.scheduler.submit(wrapper, priority=priority)
+        self._schedule_tick()
+        return task
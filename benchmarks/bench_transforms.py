@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import packager
+import transforms
+
+LINES = [
+    "    value = compute(item, {k}) # adjust the {k} factor",
+    "    // TODO: remove legacy branch {k}",
+    "function handler{k}(req, res) {{ return res.send('ok {k}'); }}   ",
+    "",
+    "    /* block comment {k} */ let x{k} = \"a // not a comment\";",
+    "    " + "x" * 40 + " = " + "'{k}' + " * 30 + "''",
+]
+
+
+def make_tree(root, total_mb, seed=0):
+    rnd = random.Random(seed)
+    written, i = 0, 0
+    while written < total_mb * 1024 * 1024:
+        d = os.path.join(root, f"pkg{i % 40}", f"mod{i % 13}")
+        os.makedirs(d, exist_ok=True)
+        ext = rnd.choice(["py", "js", "ts", "go"])
+        body = "\n".join(rnd.choice(LINES).format(k=j) for j in range(rnd.randint(200, 1500)))
+        with open(os.path.join(d, f"f{i}.{ext}"), "w", encoding="utf-8") as fh:
+            written += fh.write(body)
+        i += 1
+    return i
+
+
+def run(root, names, processes):
+    transforms.PROCESS_MIN_BYTES = 0 if processes else float("inf")
+    files = packager.collect_files(root, [])
+    cfg = {'out': os.path.join(root, "..", "bench_out.md"), 'fmt': "markdown", 'ign': [], 'src': files,
+           'root': root, 'rel_path': True, 'compress': False, 'transforms': names}
+    t = time.perf_counter()
+    packager.build_package(cfg)
+    return time.perf_counter() - t
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="内容处理: 线程内 vs 进程池")
+    ap.add_argument("--mb", type=int, default=128, help="合成源码总大小 (MB)")
+    args = ap.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix="pp_bench_")
+    try:
+        root = os.path.join(tmp, "src")
+        n = make_tree(root, args.mb)
+        names = list(transforms.TRANSFORMS)
+        print(f"{n} files, {args.mb} MB, transforms: {'+'.join(names)}, cpus: {os.cpu_count()}")
+        run(root, names, False)
+        t_thread = run(root, names, False)
+        t_proc = run(root, names, True)
+        print(f"in-thread   : {t_thread:7.2f} s  {args.mb / t_thread:7.1f} MB/s")
+        print(f"process pool: {t_proc:7.2f} s  {args.mb / t_proc:7.1f} MB/s  ({t_thread / t_proc:.1f}x)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
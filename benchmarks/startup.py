@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synth
+from suite import compare
+
+METRICS = ("import", "window", "rows")
+TIMEOUT = 60
+
+
+def child(root):
+    t0 = time.perf_counter()
+    sys.path.insert(0, REPO)
+    os.chdir(root)
+    import main
+    times = {"import": time.perf_counter() - t0}
+    app = main.ModernApp()
+    deadline = t0 + TIMEOUT
+    while "rows" not in times and time.perf_counter() < deadline:
+        app.update()
+        if "window" not in times and app.winfo_ismapped(): times["window"] = time.perf_counter() - t0
+        if app.file_tree.tree.get_children(): times["rows"] = time.perf_counter() - t0
+    app.destroy()
+    print(json.dumps(times))
+
+
+def make_flat(root, count):
+    os.makedirs(root, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(root, f"file_{i:06d}.txt"), "w") as fh: fh.write("x")
+
+
+def measure(root, repeat):
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", root],
+                              capture_output=True, text=True, timeout=TIMEOUT * 2)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines() or [f"exit {proc.returncode}"]
+            return {"skipped": lines[-1]}
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return {m: {"median": statistics.median(r[m] for r in runs), "min": min(r[m] for r in runs),
+                "runs": [r[m] for r in runs]} for m in METRICS if all(m in r for r in runs)}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="启动耗时基准: 导入 / 窗口显示 / 首批文件行渲染")
+    synth.add_arguments(ap)
+    ap.add_argument("--flat", type=int, default=20000, help="工作目录顶层额外放置的文件数 (默认: %(default)s)")
+    ap.add_argument("--root", help="直接以该目录作为工作目录, 不生成合成仓库")
+    ap.add_argument("-r", "--repeat", type=int, default=5, help="重复次数 (默认: %(default)s)")
+    ap.add_argument("-o", "--output", help="结果写入 JSON 文件")
+    ap.add_argument("--baseline", help="与基准 JSON 对比, 超出阈值时返回码为 1")
+    ap.add_argument("--threshold", type=float, default=0.2, help="允许的变慢比例 (默认: %(default)s)")
+    ap.add_argument("--update-baseline", action="store_true", help="把本次结果写入 --baseline 文件")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.child: return child(args.child)
+
+    tmp = None if args.root else tempfile.mkdtemp(prefix="pp_startup_")
+    try:
+        root = args.root
+        if root is None:
+            root = os.path.join(tmp, "repo")
+            synth.make_tree(root, **synth.tree_options(args))
+            make_flat(root, args.flat)
+        results = measure(root, args.repeat)
+    finally:
+        if tmp: shutil.rmtree(tmp, ignore_errors=True)
+
+    if "skipped" in results:
+        print(f"skipped ({results['skipped']})")
+        return 0
+    report = {"meta": {"python": sys.version.split()[0], "flat": args.flat, "root": args.root}, "results": results}
+    regressions = []
+    if args.baseline and not args.update_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as fh:
+            regressions = compare(results, json.load(fh), args.threshold)
+
+    for name, res in results.items():
+        line = f"{name:8} {res['median'] * 1000:9.1f} ms  (min {res['min'] * 1000:.1f})"
+        if "ratio" in res: line += f"  {res['ratio']:5.2f}x baseline" + ("  REGRESSION" if name in regressions else "")
+        print(line)
+
+    for path in filter(None, (args.output, args.baseline if args.update_baseline else None)):
+        with open(path, "w", encoding="utf-8") as fh: json.dump(report, fh, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import packager
+from ignore_rules import compile_ignores
+from selection import SelectionModel
+import synth
+
+BENCHMARKS = {}
+
+
+def bench(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+class Context:
+    def __init__(self, root):
+        self.root = root
+        self.ignores = packager.parse_ignores(packager.DEFAULT_IGNORES)
+        self.dirs = [d for d, _, _ in os.walk(root)]
+        self.names = [n for _, ds, fs in os.walk(root) for n in ds + fs]
+        self.files = packager.collect_files(root, self.ignores)
+        self.out = os.path.join(os.path.dirname(root), "bench_out")
+
+
+@bench("scan")
+def bench_scan(ctx):
+    for d in ctx.dirs: packager.scan_dir(d)
+    return len(ctx.dirs)
+
+
+@bench("walk")
+def bench_walk(ctx):
+    sel = SelectionModel()
+    sel.set(ctx.root, True)
+    return len(packager.resolve_selection(sel, ctx.ignores))
+
+
+@bench("ignore")
+def bench_ignore(ctx):
+    names = ctx.names * max(1, 100_000 // max(1, len(ctx.names)))
+    matcher = compile_ignores(ctx.ignores)
+    return sum(1 for n in names if packager.is_ignored(n, matcher))
+
+
+def _generate(ctx, fmt, compress):
+    cfg = {'out': ctx.out + (".xml" if fmt == "xml" else ".md"), 'fmt': fmt, 'ign': ctx.ignores, 'src': ctx.files,
+           'root': ctx.root, 'rel_path': True, 'compress': compress}
+    packager.build_package(cfg)
+    return len(cfg['manifest_rows'])
+
+
+for _fmt in ("markdown", "xml"):
+    for _compress in (False, True):
+        bench(f"generate_{_fmt}{'_compress' if _compress else ''}")(
+            lambda ctx, f=_fmt, c=_compress: _generate(ctx, f, c))
+
+
+@bench("populate")
+def bench_populate(ctx):
+    if not hasattr(ctx, "tree"):
+        import customtkinter as ctk
+        from widgets import ModernFileTree
+        ctx.tk = ctk.CTk()
+        ctx.tk.withdraw()
+        ctx.tree = ModernFileTree(ctx.tk, lambda p: None, lambda *a, **k: None)
+        ctx.rows = [row for d in ctx.dirs for row in packager.scan_dir(d)]
+    ctx.tree.populate(ctx.rows)
+    ctx.tk.update_idletasks()
+    return len(ctx.rows)
+
+
+def measure(fn, ctx, repeat):
+    fn(ctx)
+    runs = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        n = fn(ctx)
+        runs.append(time.perf_counter() - t)
+    return {"median": statistics.median(runs), "min": min(runs), "runs": runs, "items": n}
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "median" not in res or "median" not in base: continue
+        ratio = res["median"] / base["median"] if base["median"] else 1.0
+        res["baseline"], res["ratio"] = base["median"], ratio
+        if ratio > 1 + threshold: regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="性能基准: 扫描 / 遍历 / 忽略匹配 / 生成 / 文件树渲染")
+    synth.add_arguments(ap)
+    ap.add_argument("-b", "--bench", action="append", choices=list(BENCHMARKS), help="只运行指定基准 (可重复)")
+    ap.add_argument("-r", "--repeat", type=int, default=5, help="每个基准的重复次数 (默认: %(default)s)")
+    ap.add_argument("-o", "--output", help="结果写入 JSON 文件")
+    ap.add_argument("--baseline", help="与基准 JSON 对比, 超出阈值时返回码为 1")
+    ap.add_argument("--threshold", type=float, default=0.2, help="允许的变慢比例 (默认: %(default)s)")
+    ap.add_argument("--update-baseline", action="store_true", help="把本次结果写入 --baseline 文件")
+    args = ap.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix="pp_suite_")
+    try:
+        root = os.path.join(tmp, "repo")
+        tree = synth.tree_options(args)
+        stats = synth.make_tree(root, **tree)
+        ctx = Context(root)
+        print(f"{stats['files']} files ({stats['binary']} binary), {stats['dirs']} dirs, "
+              f"{packager.format_size(stats['bytes'])}")
+        results = {}
+        for name in args.bench or BENCHMARKS:
+            try:
+                results[name] = measure(BENCHMARKS[name], ctx, args.repeat)
+            except Exception as e:
+                results[name] = {"skipped": f"{type(e).__name__}: {e}"}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                       "cpus": os.cpu_count(), "tree": tree, "stats": stats},
+              "results": results}
+    regressions = []
+    if args.baseline and not args.update_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as fh:
+            regressions = compare(results, json.load(fh), args.threshold)
+
+    for name, res in results.items():
+        if "skipped" in res:
+            print(f"{name:26} skipped ({res['skipped']})")
+            continue
+        line = f"{name:26} {res['median'] * 1000:9.1f} ms  (min {res['min'] * 1000:.1f})"
+        if "ratio" in res: line += f"  {res['ratio']:5.2f}x baseline" + ("  REGRESSION" if name in regressions else "")
+        print(line)
+
+    for path in filter(None, (args.output, args.baseline if args.update_baseline else None)):
+        with open(path, "w", encoding="utf-8") as fh: json.dump(report, fh, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import os
+import random
+import argparse
+
+WORDS = ["value", "item", "result", "config", "handler", "request", "buffer", "index", "node", "cache"]
+TEXT_EXTS = ["py", "js", "ts", "md", "json", "go", "rs", "c", "h", "txt"]
+BINARY_EXTS = ["png", "bin", "zip", "so"]
+NOISE_DIRS = ["node_modules", "__pycache__", "build"]
+
+
+def _text(rnd, size):
+    lines, n = [], 0
+    while n < size:
+        indent = "    " * rnd.randint(0, 3)
+        line = indent + " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(2, 10)))
+        if rnd.random() < 0.15: line += "  # " + rnd.choice(WORDS)
+        if rnd.random() < 0.1: lines.append("")
+        lines.append(line)
+        n += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+def _size(rnd, mean, sigma, max_size):
+    return max(1, min(max_size, int(rnd.lognormvariate(0, sigma) * mean)))
+
+
+def make_tree(root, depth=3, fanout=4, files_per_dir=12, mean_size=4096, sigma=1.0, max_size=1024 * 1024,
+              binary_fraction=0.05, noise_dirs=True, seed=0):
+    rnd = random.Random(seed)
+    stats = {"files": 0, "dirs": 0, "bytes": 0, "binary": 0}
+
+    def fill(d, level):
+        os.makedirs(d, exist_ok=True)
+        stats["dirs"] += 1
+        for i in range(files_per_dir):
+            size = _size(rnd, mean_size, sigma, max_size)
+            if rnd.random() < binary_fraction:
+                path = os.path.join(d, f"blob_{i}.{rnd.choice(BINARY_EXTS)}")
+                data = rnd.randbytes(min(size, 4096)) * max(1, size // 4096)
+                stats["binary"] += 1
+            else:
+                path = os.path.join(d, f"mod_{i}.{rnd.choice(TEXT_EXTS)}")
+                data = _text(rnd, size).encode("utf-8")
+            with open(path, "wb") as fh: fh.write(data)
+            stats["files"] += 1
+            stats["bytes"] += len(data)
+        if level >= depth: return
+        for j in range(fanout):
+            fill(os.path.join(d, f"pkg_{level}_{j}"), level + 1)
+        if noise_dirs and level == 1:
+            fill(os.path.join(d, rnd.choice(NOISE_DIRS)), depth)
+
+    fill(str(root), 0)
+    return stats
+
+
+def add_arguments(ap):
+    ap.add_argument("--depth", type=int, default=3, help="目录深度 (默认: %(default)s)")
+    ap.add_argument("--fanout", type=int, default=4, help="每层子目录数 (默认: %(default)s)")
+    ap.add_argument("--files", type=int, default=12, help="每个目录的文件数 (默认: %(default)s)")
+    ap.add_argument("--mean-size", type=int, default=4096, help="文件大小中位数, 字节 (默认: %(default)s)")
+    ap.add_argument("--sigma", type=float, default=1.0, help="文件大小对数正态分布的 sigma (默认: %(default)s)")
+    ap.add_argument("--binary", type=float, default=0.05, help="二进制文件比例 (默认: %(default)s)")
+    ap.add_argument("--seed", type=int, default=0)
+
+
+def tree_options(args):
+    return dict(depth=args.depth, fanout=args.fanout, files_per_dir=args.files, mean_size=args.mean_size,
+                sigma=args.sigma, binary_fraction=args.binary, seed=args.seed)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="生成确定性的合成仓库")
+    ap.add_argument("root")
+    add_arguments(ap)
+    args = ap.parse_args(argv)
+    print(make_tree(args.root, **tree_options(args)))
+
+
+if __name__ == "__main__":
+    main()
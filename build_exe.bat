@@ -1,9 +1,13 @@
 @echo off
+rem Usage: build_exe.bat [--onedir]
+set MODE=--onefile
+if /i "%~1"=="--onedir" set MODE=--onedir
+
 echo Installing dependencies...
 pip install -r requirements.txt
 
-echo Building executable...
-pyinstaller --noconfirm --onefile --windowed --name "PromptPackager" --collect-all customtkinter --icon=NONE main.py
+echo Building executable (%MODE%)...
+pyinstaller --noconfirm %MODE% --windowed --name "PromptPackager" --collect-all customtkinter --icon=NONE main.py
 
 echo Build complete. Check the "dist" folder.
-pause
\ No newline at end of file
+pause
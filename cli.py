@@ -0,0 +1,209 @@
+import sys
+import time
+import argparse
+import multiprocessing
+from pathlib import Path
+
+import packager
+import transforms
+import deps
+import jobs
+from content_cache import ContentCache, MemoryCache
+from watcher import WatchSession
+from instrument import Trace, profiled
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(prog="python -m cli", description="Prompt Packager 无界面打包")
+    ap.add_argument("root", nargs="?", default=".", help="工作区根目录 (默认: 当前目录)")
+    ap.add_argument("-i", "--include", action="append", default=[], metavar="GLOB",
+                    help="只打包匹配的文件 (相对路径或文件名, 可重复)")
+    ap.add_argument("-d", "--deps", action="store_true",
+                    help="同时打包所选 Python / JS / TS 文件在仓库内的传递依赖")
+    ap.add_argument("-x", "--ignore", action="append", default=[], metavar="RULES",
+                    help="追加忽略规则, 用 ; 分隔 (可重复)")
+    ap.add_argument("--no-default-ignores", action="store_true", help="不使用内置忽略规则")
+    ap.add_argument("--no-gitignore", dest="gitignore", action="store_false", help="不读取 .gitignore / .ignore")
+    ap.add_argument("-f", "--format", choices=("markdown", "xml"), default="markdown")
+    ap.add_argument("--no-rel-path", dest="rel_path", action="store_false", help="只写入文件名")
+    ap.add_argument("-c", "--compress", action="store_true", help="压缩空行/回车")
+    ap.add_argument("-t", "--transform", action="append", default=[], choices=list(transforms.TRANSFORMS),
+                    help="内容处理步骤 (可重复)")
+    ap.add_argument("--max-line", type=int, default=transforms.DEFAULT_MAX_LINE, metavar="N",
+                    help="truncate_lines 的行长上限 (默认: %(default)s)")
+    ap.add_argument("--no-dedup", dest="dedup", action="store_false", help="不合并内容相同的文件")
+    ap.add_argument("--max-file", type=float, default=packager.DEFAULT_MAX_FILE / 1024 / 1024, metavar="MB",
+                    help="单个文件上限, 超出时只保留首尾 (默认: %(default)s MB, 0 = 不限制)")
+    ap.add_argument("--max-total", type=float, default=0, metavar="MB",
+                    help="全部文件内容上限, 超出的文件跳过 (默认: 0 = 不限制)")
+    ap.add_argument("--max-tokens", type=int, default=0, metavar="N",
+                    help="Token 预算, 超出时按优先级截断或丢弃文件 (默认: 0 = 不限制)")
+    ap.add_argument("-p", "--priority", action="append", default=[], metavar="GLOB",
+                    help="预算模式下优先保留的文件, 越靠前越优先 (可重复); 其余按目录深度和大小排序")
+    ap.add_argument("--exact-tokens", action="store_true", help="如已安装 tiktoken, 使用精确计数")
+    ap.add_argument("--shard-size", type=float, default=0, metavar="MB",
+                    help="按大小拆分为多个文件, 并生成 .index.json 索引 (默认: 0 = 不拆分)")
+    ap.add_argument("--shard-tokens", type=int, default=0, metavar="N", help="按 token 数拆分为多个文件")
+    ap.add_argument("--max-inflight", type=int, default=64, metavar="MB",
+                    help="同时读取在内存中的文件内容上限 (默认: 64 MB)")
+    ap.add_argument("--no-cache", dest="cache", action="store_false", help="不使用文件内容缓存")
+    ap.add_argument("--cache-dir", help="缓存目录 (默认: 用户缓存目录/PromptPackager)")
+    ap.add_argument("--clear-cache", action="store_true", help="生成前清空文件内容缓存")
+    ap.add_argument("--no-manifest", dest="manifest", action="store_false",
+                    help="不写入清单文件 (默认写入 <输出名>.manifest.json)")
+    ap.add_argument("--delta", nargs="?", const="", metavar="MANIFEST",
+                    help="只输出相对上次清单新增/修改的文件及已删除路径 (默认: 输出文件对应的清单)")
+    ap.add_argument("-w", "--watch", action="store_true", help="生成后持续监视目录, 文件变更时自动增量更新")
+    ap.add_argument("--poll", action="store_true", help="监视时使用 stat 轮询 (默认: Linux 上使用 inotify)")
+    ap.add_argument("--stats-json", metavar="FILE", help="写入各阶段耗时统计 (JSON)")
+    ap.add_argument("--trace", metavar="FILE", help="写入 Chrome trace 文件 (chrome://tracing / Perfetto)")
+    ap.add_argument("--profile", metavar="FILE", help="用 cProfile 分析生成过程并写入 pstats 文件")
+    ap.add_argument("--save-job", metavar="NAME", help="把本次参数保存为批量任务 (同名覆盖)")
+    ap.add_argument("--build-all", action="store_true", help="并行生成所有已保存的批量任务, 忽略其他参数")
+    ap.add_argument("--job", action="append", default=[], metavar="NAME", help="配合 --build-all 只生成指定任务 (可重复)")
+    ap.add_argument("--jobs-file", metavar="FILE", help="批量任务文件 (默认: 用户缓存目录/PromptPackager/jobs.json)")
+    ap.add_argument("-o", "--output", help="输出文件 (默认: prompt_context.md / .xml)")
+    return ap
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.build_all: return build_all(args)
+    root = Path(args.root).resolve()
+    if not root.is_dir():
+        print(f"错误: 目录不存在 {root}", file=sys.stderr)
+        return 2
+
+    ign = [] if args.no_default_ignores else [packager.DEFAULT_IGNORES]
+    ign = packager.parse_ignores(ign + args.ignore)
+    files = collect(root, ign, args)
+    if not files:
+        print("错误: 没有匹配的文件", file=sys.stderr)
+        return 1
+
+    cache = None
+    if args.cache:
+        cache = ContentCache(Path(args.cache_dir) / "content.db" if args.cache_dir else None)
+        if args.clear_cache: cache.invalidate()
+
+    out = args.output or ("prompt_context.xml" if args.format == "xml" else "prompt_context.md")
+    cfg = make_config(args, root, files, ign, cache, out)
+    try:
+        cfg['out'].parent.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        print(f"错误: 无法创建输出目录 {cfg['out'].parent} ({e.strerror})", file=sys.stderr)
+        if cache is not None: cache.close()
+        return 2
+    if args.save_job:
+        cfg['gitignore'] = args.gitignore
+        jobs.put_job(jobs.job_from_config(args.save_job, cfg, globs=args.include, with_deps=args.deps), args.jobs_file)
+    try:
+        with profiled(args.profile): print(packager.build_package(cfg))
+        print_report(cfg['report'], args)
+        write_trace(cfg['trace'], args)
+        if args.watch: watch(cfg, args, root, ign)
+    except KeyboardInterrupt:
+        if not args.watch: raise
+    finally:
+        if cache is not None: cache.close()
+    return 0
+
+
+def build_all(args):
+    selected = [j for j in jobs.load_jobs(args.jobs_file) if not args.job or j.get("name") in args.job]
+    if not selected:
+        print("错误: 没有已保存的任务", file=sys.stderr)
+        return 1
+    cache = None
+    if args.cache:
+        cache = ContentCache(Path(args.cache_dir) / "content.db" if args.cache_dir else None)
+        if args.clear_cache: cache.invalidate()
+    try:
+        summary = jobs.build_all(selected, cache)
+    finally:
+        if cache is not None: cache.close()
+    print(jobs.format_results(summary), file=sys.stderr)
+    return 1 if any(res["error"] for res in summary["jobs"]) else 0
+
+
+def collect(root, ign, args):
+    files = packager.collect_files(root, ign, args.include, args.gitignore)
+    if args.deps and args.include: files = deps.closure(files, root, ign, args.gitignore)
+    return files
+
+
+def make_config(args, root, files, ign, cache, out):
+    return {
+        'out': Path(out) if out else None,
+        'fmt': args.format,
+        'ign': ign,
+        'src': files,
+        'root': root,
+        'rel_path': args.rel_path,
+        'compress': args.compress,
+        'transforms': args.transform,
+        'transform_opts': {"max_line": args.max_line},
+        'dedup': args.dedup,
+        'max_file': int(args.max_file * 1024 * 1024),
+        'max_total': int(args.max_total * 1024 * 1024),
+        'max_tokens': args.max_tokens,
+        'priority': args.priority,
+        'exact_tokens': args.exact_tokens,
+        'shard_bytes': int(args.shard_size * 1024 * 1024),
+        'shard_tokens': args.shard_tokens,
+        'max_inflight': args.max_inflight * 1024 * 1024,
+        'manifest': packager.manifest_path(out) if args.manifest and out else None,
+        'delta': (args.delta or packager.manifest_path(out)) if args.delta is not None and out else None,
+        'cache': cache,
+        'trace': Trace(spans=bool(args.trace))
+    }
+
+
+def print_report(report, args):
+    if report.get('binary') or report.get('over_limit') or report.get('truncated'):
+        print(f"跳过二进制 {report['binary']} 个, 超出总量 {report['over_limit']} 个, "
+              f"截断 {report['truncated']} 个", file=sys.stderr)
+    if report.get('dropped') or report.get('token_truncated'):
+        print(f"超出 Token 预算: 丢弃 {report['dropped']} 个, 截断 {report['token_truncated']} 个", file=sys.stderr)
+    if args.delta is not None:
+        print(f"新增 {report['added']} 个, 修改 {report['modified']} 个, 删除 {report['deleted']} 个",
+              file=sys.stderr)
+    shards = f", 共 {report['shards']} 个分片" if report.get('shards') else ""
+    print(f"约 {report['tokens']} tokens{shards}", file=sys.stderr)
+    if report.get('dup_files'):
+        print(f"重复文件 {report['dup_files']} 个, 节省 {packager.format_size(report['dup_bytes'])}",
+              file=sys.stderr)
+
+
+def write_trace(trace, args):
+    print(trace.summary(), file=sys.stderr)
+    if args.stats_json: trace.write_json(args.stats_json)
+    if args.trace: trace.write_chrome(args.trace)
+
+
+def watch(cfg, args, root, ign):
+    out = cfg['out'].resolve()
+    cfg.update(cache=MemoryCache(cfg['cache']), atomic=True, delta=None, known=cfg['manifest_rows'])
+
+    def regenerate(events):
+        if any(structural for _, structural in events):
+            cfg['src'] = collect(root, ign, args)
+        t = time.perf_counter()
+        cfg['trace'] = Trace(spans=bool(args.trace))
+        try:
+            packager.build_package(cfg)
+        except Exception as e:
+            print(f"错误: {e}", file=sys.stderr)
+            return
+        cfg['known'] = cfg['manifest_rows']
+        print(f"[{time.strftime('%H:%M:%S')}] {len(events)} 处变更, 已更新 {out.name} "
+              f"({time.perf_counter() - t:.2f} 秒)", file=sys.stderr)
+
+    print(f"正在监视 {root} (Ctrl+C 退出)", file=sys.stderr)
+    WatchSession([root], ign, args.gitignore, regenerate, polling=args.poll,
+                 exclude=packager.own_outputs(out)).run()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
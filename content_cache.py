@@ -0,0 +1,169 @@
+import os
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def default_cache_dir():
+    base = os.environ.get("LOCALAPPDATA") if os.name == "nt" else None
+    base = base or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "PromptPackager"
+
+
+class ContentCache:
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        path = Path(path) if path else default_cache_dir() / "content.db"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS content ("
+            "path TEXT, opts TEXT, size INTEGER, mtime_ns INTEGER, nbytes INTEGER, used REAL, data TEXT, "
+            "PRIMARY KEY (path, opts))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS content_used ON content (used)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            "path TEXT, opts TEXT, size INTEGER, mtime_ns INTEGER, count INTEGER, PRIMARY KEY (path, opts))")
+
+    def get(self, path, size, mtime_ns, opts=""):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, data FROM content WHERE path=? AND opts=?", (path, opts)).fetchone()
+            if row is None or row[0] != size or row[1] != mtime_ns:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[(path, opts)] = time.time()
+            return row[2]
+
+    def put(self, path, size, mtime_ns, data, opts=""):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO content VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, opts, size, mtime_ns, len(data), time.time(), data))
+
+    def get_tokens(self, path, size, mtime_ns, opts=""):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, count FROM tokens WHERE path=? AND opts=?", (path, opts)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns: return None
+        return row[2]
+
+    def put_tokens(self, path, size, mtime_ns, count, opts=""):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?, ?)",
+                             (path, opts, size, mtime_ns, count))
+
+    def flush(self):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._db.execute("BEGIN")
+            self._db.executemany("UPDATE content SET used=? WHERE path=? AND opts=?",
+                                 [(t, p, o) for (p, o), t in touched.items()])
+            total = self._db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM content").fetchone()[0]
+            if total > self.max_bytes:
+                drop = []
+                for path, opts, nbytes in self._db.execute("SELECT path, opts, nbytes FROM content ORDER BY used"):
+                    if total <= self.max_bytes: break
+                    drop.append((path, opts))
+                    total -= nbytes
+                self._db.executemany("DELETE FROM content WHERE path=? AND opts=?", drop)
+            self._db.execute("COMMIT")
+
+    def invalidate(self, path=None):
+        with self._lock:
+            self._touched.clear()
+            if path is None:
+                where, args = "", ()
+            else:
+                path = str(path)
+                prefix = os.path.join(path, "").replace("%", "\\%").replace("_", "\\_")
+                where, args = " WHERE path=? OR path LIKE ? ESCAPE '\\'", (path, prefix + "%")
+            for table in ("content", "tokens"):
+                self._db.execute(f"DELETE FROM {table}{where}", args)
+
+    def stats(self):
+        with self._lock:
+            n, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM content").fetchone()
+        return {"entries": n, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+class MemoryCache:
+    def __init__(self, backing=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.backing = backing
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._content = OrderedDict()
+        self._tokens = {}
+        self._bytes = 0
+
+    def get(self, path, size, mtime_ns, opts=""):
+        with self._lock:
+            row = self._content.get((path, opts))
+            if row is not None and row[0] == size and row[1] == mtime_ns:
+                self._content.move_to_end((path, opts))
+                self.hits += 1
+                return row[2]
+        data = self.backing.get(path, size, mtime_ns, opts) if self.backing is not None else None
+        if data is None: self.misses += 1
+        else: self._store(path, size, mtime_ns, data, opts)
+        return data
+
+    def put(self, path, size, mtime_ns, data, opts=""):
+        self._store(path, size, mtime_ns, data, opts)
+        if self.backing is not None: self.backing.put(path, size, mtime_ns, data, opts)
+
+    def _store(self, path, size, mtime_ns, data, opts):
+        with self._lock:
+            old = self._content.pop((path, opts), None)
+            if old is not None: self._bytes -= len(old[2])
+            self._content[(path, opts)] = (size, mtime_ns, data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and self._content:
+                self._bytes -= len(self._content.popitem(last=False)[1][2])
+
+    def get_tokens(self, path, size, mtime_ns, opts=""):
+        row = self._tokens.get((path, opts))
+        if row is not None and row[0] == size and row[1] == mtime_ns: return row[2]
+        n = self.backing.get_tokens(path, size, mtime_ns, opts) if self.backing is not None else None
+        if n is not None: self._tokens[(path, opts)] = (size, mtime_ns, n)
+        return n
+
+    def put_tokens(self, path, size, mtime_ns, count, opts=""):
+        self._tokens[(path, opts)] = (size, mtime_ns, count)
+        if self.backing is not None: self.backing.put_tokens(path, size, mtime_ns, count, opts)
+
+    def flush(self):
+        if self.backing is not None: self.backing.flush()
+
+    def invalidate(self, path=None):
+        with self._lock:
+            prefix = None if path is None else os.path.join(str(path), "")
+            for store in (self._content, self._tokens):
+                for key in [k for k in store if prefix is None or k[0] == str(path) or k[0].startswith(prefix)]:
+                    row = store.pop(key)
+                    if store is self._content: self._bytes -= len(row[2])
+        if self.backing is not None: self.backing.invalidate(path)
+
+    def stats(self):
+        return {"entries": len(self._content), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        if self.backing is not None: self.backing.close()
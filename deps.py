@@ -0,0 +1,244 @@
+import os
+import re
+import ast
+import threading
+
+from ignore_rules import IgnoreRules
+from scheduler import get_scheduler, BACKGROUND
+
+PY_EXTS = {".py", ".pyi"}
+JS_EXTS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs", ".mts", ".cts")
+PARSE_BATCH = 32
+MAX_SOURCE = 2 * 1024 * 1024
+
+_JS_FROM = re.compile(r'''(?:^|[;\s])(?:import|export)\s+(?:type\s+)?(?:[\w*${},\s]+?\s+from\s+)?['"]([^'"\n]+)['"]''')
+_JS_CALL = re.compile(r'''\b(?:require|import)\s*\(\s*['"]([^'"\n]+)['"]\s*\)''')
+_PY_FALLBACK = re.compile(r'^\s*(?:from\s+(\.*)([\w.]*)\s+import\s+([\w*, ()]+)|import\s+([\w., ]+))', re.M)
+
+
+def supported(path):
+    ext = os.path.splitext(str(path))[1].lower()
+    return ext in PY_EXTS or ext in JS_EXTS
+
+
+def _python_imports(text):
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        specs = []
+        for dots, module, names, plain in _PY_FALLBACK.findall(text):
+            if plain: specs += [(n.split(" as ")[0].strip(), 0, ()) for n in plain.split(",") if n.strip()]
+            else: specs.append((module, len(dots), tuple(n.split(" as ")[0].strip() for n in names.strip("()").split(","))))
+        return specs
+    specs = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            specs += [(a.name, 0, ()) for a in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            specs.append((node.module or "", node.level, tuple(a.name for a in node.names)))
+    return specs
+
+
+def _js_imports(text):
+    return [(m, 0, ()) for rx in (_JS_FROM, _JS_CALL) for m in rx.findall(text)]
+
+
+def _parse(paths):
+    res = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            if st.st_size > MAX_SOURCE: raise OSError
+            with open(p, "rb") as fh: text = fh.read().decode("utf-8", errors="ignore")
+        except OSError:
+            res.append((None, ()))
+            continue
+        ext = os.path.splitext(p)[1].lower()
+        specs = _python_imports(text) if ext in PY_EXTS else _js_imports(text) if ext in JS_EXTS else []
+        res.append(((st.st_size, st.st_mtime_ns), tuple(specs)))
+    return res
+
+
+class ImportGraph:
+    def __init__(self):
+        self._specs = {}
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def imports(self, paths):
+        res, missing = {}, []
+        for p in paths:
+            if not supported(p):
+                res[p] = (None, ())
+                continue
+            try:
+                st = os.stat(p)
+                stamp = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                res[p] = (None, ())
+                continue
+            with self._lock: hit = self._specs.get(p)
+            if hit is not None and hit[0] == stamp: res[p] = hit
+            else: missing.append(p)
+        sched = get_scheduler()
+        jobs = [(missing[i:i + PARSE_BATCH], sched.submit(_parse, missing[i:i + PARSE_BATCH], priority=BACKGROUND))
+                for i in range(0, len(missing), PARSE_BATCH)]
+        for batch, job in jobs:
+            for p, parsed in zip(batch, sched.result(job)):
+                res[p] = parsed
+                if parsed[0] is not None:
+                    with self._lock: self._specs[p] = parsed
+        return res
+
+    def closure(self, paths, root, ignores=(), gitignore=True):
+        root = os.path.abspath(str(root))
+        rules = IgnoreRules.for_dir(root, ignores, gitignore)
+        prefix = os.path.join(root, "")
+        probe = _Probe()
+        dirs = _Memo(_mtime)
+
+        def check(p):
+            if not p.startswith(prefix): return False
+            if any(rules.matcher(part) for part in p[len(prefix):].split(os.sep)): return False
+            return not rules.ignored(p)
+        allowed = _Memo(check)
+
+        result = {os.path.abspath(str(p)) for p in paths}
+        frontier = sorted(result)
+        while frontier:
+            parsed = self.imports(frontier)
+            nxt = []
+            for p in frontier:
+                stamp, specs = parsed[p]
+                with self._lock: hit = self._resolved.get((p, root))
+                if hit is not None and hit[0] == stamp and all(dirs[d] == m for d, m in hit[2]):
+                    found = hit[1]
+                else:
+                    probe.touched = set()
+                    resolve = _resolve_python if os.path.splitext(p)[1].lower() in PY_EXTS else _resolve_js
+                    found = resolve(p, specs, root, probe)
+                    if stamp is not None:
+                        with self._lock:
+                            self._resolved[p, root] = (stamp, found, tuple((d, dirs[d]) for d in probe.touched))
+                for dep in found:
+                    if dep in result or not allowed[dep]: continue
+                    result.add(dep)
+                    nxt.append(dep)
+            frontier = nxt
+        return sorted(result)
+
+    def clear(self):
+        with self._lock:
+            self._specs.clear()
+            self._resolved.clear()
+
+
+class _Memo(dict):
+    def __init__(self, fn):
+        super().__init__()
+        self.fn = fn
+
+    def __missing__(self, key):
+        value = self[key] = self.fn(key)
+        return value
+
+
+class _Probe:
+    def __init__(self):
+        self.files = {}
+        self.modules = {}
+        self.touched = set()
+
+    def isfile(self, path):
+        self.touched.add(os.path.dirname(path))
+        hit = self.files.get(path)
+        if hit is None: hit = self.files[path] = os.path.isfile(path)
+        return hit
+
+    def module(self, base, parts):
+        hit = self.modules.get((base, parts))
+        if hit is None:
+            outer, self.touched = self.touched, set()
+            hit = self.modules[base, parts] = (_module_files(base, parts, self.isfile), self.touched)
+            self.touched = outer
+        self.touched |= hit[1]
+        return hit[0]
+
+
+def _mtime(path):
+    try: return os.stat(path).st_mtime_ns
+    except OSError: return None
+
+
+def _python_bases(path, root, isfile):
+    d = os.path.dirname(path)
+    top = d
+    while top.startswith(root) and top != root and isfile(os.path.join(top, "__init__.py")): top = os.path.dirname(top)
+    return list(dict.fromkeys([d, top, root, os.path.join(root, "src")]))
+
+
+def _module_files(base, parts, isfile):
+    found, d = [], base
+    for i, part in enumerate(parts):
+        d = os.path.join(d, part)
+        init = os.path.join(d, "__init__.py")
+        if i == len(parts) - 1:
+            for cand in (d + ".py", d + ".pyi", init):
+                if isfile(cand): return found + [cand]
+            return None
+        if isfile(init): found.append(init)
+
+
+def _resolve_python(path, specs, root, probe):
+    deps = []
+    bases = None
+    for module, level, names in specs:
+        parts = [p for p in module.split(".") if p]
+        if level:
+            base = os.path.dirname(path)
+            for _ in range(level - 1): base = os.path.dirname(base)
+            candidates = [base]
+        else:
+            bases = bases or _python_bases(path, root, probe.isfile)
+            candidates = bases
+        for base in candidates:
+            if parts: hit = probe.module(base, tuple(parts))
+            else: hit = [init for init in (os.path.join(base, "__init__.py"),) if probe.isfile(init)]
+            if hit is None: continue
+            deps += hit
+            for name in names:
+                if name == "*": continue
+                sub = probe.module(base, tuple(parts) + (name,))
+                if sub: deps.append(sub[-1])
+            break
+    return deps
+
+
+def _resolve_js(path, specs, root, probe):
+    deps = []
+    for spec, _, _ in specs:
+        spec = spec.split("?")[0]
+        if spec.startswith("."): p = os.path.normpath(os.path.join(os.path.dirname(path), spec))
+        elif spec.startswith("/"): p = os.path.normpath(os.path.join(root, spec.lstrip("/")))
+        else: continue
+        stem, ext = os.path.splitext(p)
+        candidates = [p] + [p + e for e in JS_EXTS] + [os.path.join(p, "index" + e) for e in JS_EXTS]
+        if ext in (".js", ".jsx", ".mjs", ".cjs"): candidates += [stem + e for e in (".ts", ".tsx", ".mts", ".cts")]
+        hit = next((c for c in candidates if probe.isfile(c)), None)
+        if hit: deps.append(hit)
+    return deps
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    global _graph
+    with _graph_lock:
+        if _graph is None: _graph = ImportGraph()
+        return _graph
+
+
+def closure(paths, root, ignores=(), gitignore=True):
+    return get_graph().closure(paths, root, ignores, gitignore)
@@ -0,0 +1,70 @@
+import os
+import threading
+from collections import OrderedDict
+
+from packager import scan_dir
+
+ROW_KEYS = ("is_dir", "size", "mtime")
+
+
+def diff_listing(old, new):
+    old_map = {r["path"]: r for r in old}
+    new_map = {r["path"]: r for r in new}
+    added = [r for p, r in new_map.items() if p not in old_map]
+    removed = [p for p in old_map if p not in new_map]
+    changed = [r for p, r in new_map.items()
+               if p in old_map and any(old_map[p].get(k) != r.get(k) for k in ROW_KEYS)]
+    return added, removed, changed
+
+
+class DirListingCache:
+    def __init__(self, max_dirs=128):
+        self.max_dirs = max_dirs
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def _dir_mtime(self, path):
+        try: return os.stat(path).st_mtime_ns
+        except OSError: return None
+
+    def _store(self, path, mtime_ns, items):
+        with self._lock:
+            self._items[path] = (mtime_ns, items)
+            self._items.move_to_end(path)
+            while len(self._items) > self.max_dirs:
+                self._items.popitem(last=False)
+
+    def get(self, path):
+        path = str(path)
+        with self._lock:
+            hit = self._items.get(path)
+            if hit is None: return None
+            self._items.move_to_end(path)
+            return hit[1]
+
+    def scan(self, path, limit=None):
+        path = str(path)
+        mtime_ns = self._dir_mtime(path)
+        with self._lock:
+            hit = self._items.get(path)
+        if hit is not None and mtime_ns is not None and hit[0] == mtime_ns:
+            return hit[1]
+        items = scan_dir(path, limit)
+        if limit is None or len(items) < limit: self._store(path, mtime_ns, items)
+        return items
+
+    def revalidate(self, path):
+        path = str(path)
+        with self._lock:
+            hit = self._items.get(path)
+        mtime_ns = self._dir_mtime(path)
+        if hit is not None and mtime_ns is not None and hit[0] == mtime_ns: return path, [], [], []
+        items = scan_dir(path)
+        self._store(path, mtime_ns, items)
+        if hit is None: return path, items, [], []
+        return (path,) + diff_listing(hit[1], items)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            for key in list(self._items) if path is None else [str(path)]:
+                if key in self._items: self._items[key] = (None, self._items[key][1])
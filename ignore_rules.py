@@ -0,0 +1,151 @@
+import os
+import re
+import fnmatch
+from functools import lru_cache
+
+IGNORE_FILES = (".gitignore", ".ignore")
+_GLOB_CHARS = set("*?[")
+_FLAGS = re.IGNORECASE if os.name == "nt" else 0
+
+
+class IgnoreMatcher:
+    def __init__(self, patterns):
+        self.names = set()
+        self.suffixes = set()
+        residual = []
+        for pat in patterns:
+            pat = os.path.normcase(pat)
+            if not _GLOB_CHARS.intersection(pat):
+                self.names.add(pat)
+            elif pat.startswith("*.") and not _GLOB_CHARS.intersection(pat[1:]):
+                self.suffixes.add(pat[1:])
+            else:
+                residual.append(fnmatch.translate(pat))
+        self.regex = re.compile("|".join(residual)) if residual else None
+
+    def __call__(self, name):
+        name = os.path.normcase(name)
+        if name in self.names: return True
+        if self.suffixes:
+            i = name.find(".")
+            while i != -1:
+                if name[i:] in self.suffixes: return True
+                i = name.find(".", i + 1)
+        return self.regex is not None and self.regex.match(name) is not None
+
+
+@lru_cache(maxsize=32)
+def _matcher(patterns):
+    return IgnoreMatcher(patterns)
+
+
+def compile_ignores(patterns):
+    return _matcher(tuple(patterns))
+
+
+def _translate(pat):
+    i, n, out = 0, len(pat), []
+    while i < n:
+        c = pat[i]
+        if pat.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pat.startswith("**", i) and i + 2 == n:
+            out.append(".*")
+            break
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pat[i]))
+        elif c == "[":
+            j = pat.find("]", i + 2 if pat[i + 1:i + 2] in ("!", "^") else i + 1)
+            if j == -1:
+                out.append("\\[")
+            else:
+                body = pat[i + 1:j].replace("\\", "\\\\")
+                if body[:1] in ("!", "^"): body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = j
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class GitIgnore:
+    def __init__(self, lines):
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n\r")
+            if not line or line.startswith("#"): continue
+            while line.endswith(" ") and not line.endswith("\\ "): line = line[:-1]
+            neg = line.startswith("!")
+            if neg: line = line[1:]
+            elif line.startswith("\\!") or line.startswith("\\#"): line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line: continue
+            anchored = "/" in line
+            line = line.lstrip("/")
+            rx = _translate(line)
+            if not anchored: rx = "(?:.*/)?" + rx
+            self.rules.append((re.compile(rx + r"\Z", _FLAGS), neg, dir_only))
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path, encoding="utf-8", errors="ignore") as fh:
+                return cls(fh.readlines())
+        except OSError: return None
+
+    def match(self, rel, is_dir):
+        res = None
+        for rx, neg, dir_only in self.rules:
+            if dir_only and not is_dir: continue
+            if rx.match(rel): res = not neg
+        return res
+
+
+class IgnoreRules:
+    def __init__(self, patterns, use_gitignore=True, _layers=()):
+        self.matcher = patterns if isinstance(patterns, IgnoreMatcher) else compile_ignores(patterns)
+        self.use_gitignore = use_gitignore
+        self.layers = _layers
+
+    def child(self, dirpath, names=None):
+        if not self.use_gitignore: return self
+        files = [f for f in IGNORE_FILES if names is None or f in names]
+        found = [g for g in (GitIgnore.from_file(os.path.join(dirpath, f)) for f in files) if g and g.rules]
+        if not found: return self
+        prefix = os.path.join(dirpath, "")
+        return IgnoreRules(self.matcher, True, self.layers + tuple((prefix, g) for g in found))
+
+    @classmethod
+    def for_dir(cls, dirpath, patterns, use_gitignore=True):
+        rules = cls(patterns, use_gitignore)
+        if not use_gitignore: return rules
+        dirpath = os.path.abspath(dirpath)
+        chain, cur = [], dirpath
+        while True:
+            chain.append(cur)
+            if os.path.isdir(os.path.join(cur, ".git")): break
+            parent = os.path.dirname(cur)
+            if parent == cur:
+                chain = [dirpath]
+                break
+            cur = parent
+        for d in reversed(chain): rules = rules.child(d)
+        return rules
+
+    def ignored(self, path, is_dir=False):
+        if self.matcher(os.path.basename(path)): return True
+        res = None
+        for prefix, g in self.layers:
+            if not path.startswith(prefix): continue
+            m = g.match(path[len(prefix):].replace("\\", "/"), is_dir)
+            if m is not None: res = m
+        return bool(res)
@@ -0,0 +1,125 @@
+import json
+import time
+import heapq
+import threading
+from contextlib import contextmanager
+
+SLOWEST_FILES = 10
+STAGE_LABELS = {
+    "resolve": "解析选择", "plan": "计划", "delta": "增量比对", "budget": "预算", "read": "读取", "cache": "缓存",
+    "transform": "处理", "format": "写入", "stream": "流水线", "manifest": "清单", "total": "总计",
+}
+
+
+class Trace:
+    def __init__(self, slowest=SLOWEST_FILES, spans=False):
+        self.slowest = slowest
+        self.record_spans = spans
+        self.origin = time.perf_counter()
+        self.stages = {}
+        self.spans = []
+        self.files = []
+        self.queue = []
+        self.totals = {"files": 0, "bytes": 0}
+        self._lock = threading.Lock()
+
+    def add(self, name, start, end=None, cpu=0.0, span=True):
+        end = time.perf_counter() if end is None else end
+        with self._lock:
+            agg = self.stages.setdefault(name, [0.0, 0.0, 0])
+            agg[0] += end - start
+            agg[1] += cpu
+            agg[2] += 1
+            if span: self.spans.append((name, start, end - start, threading.get_ident()))
+
+    @contextmanager
+    def stage(self, name):
+        start, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, start, cpu=time.process_time() - cpu)
+
+    def file(self, path, size, start, end=None):
+        end = time.perf_counter() if end is None else end
+        item = (end - start, path, size)
+        with self._lock:
+            if len(self.files) < self.slowest: heapq.heappush(self.files, item)
+            elif item > self.files[0]: heapq.heapreplace(self.files, item)
+            if self.record_spans: self.spans.append((path, start, end - start, threading.get_ident()))
+
+    def sample_queue(self, depth):
+        with self._lock:
+            self.queue.append(depth)
+
+    def count(self, files, nbytes):
+        with self._lock:
+            self.totals["files"] += files
+            self.totals["bytes"] += nbytes
+
+    def wall(self, name):
+        return self.stages.get(name, (0.0,))[0]
+
+    def to_dict(self):
+        stream = self.wall("stream") or self.wall("total")
+        return {
+            "stages": {k: {"wall": w, "cpu": c, "calls": n} for k, (w, c, n) in self.stages.items()},
+            "files": self.totals["files"],
+            "bytes": self.totals["bytes"],
+            "files_per_s": self.totals["files"] / stream if stream else None,
+            "bytes_per_s": self.totals["bytes"] / stream if stream else None,
+            "slowest": [{"path": p, "seconds": d, "size": s} for d, p, s in sorted(self.files, reverse=True)],
+            "queue_depth": {"max": max(self.queue, default=0),
+                            "mean": sum(self.queue) / len(self.queue) if self.queue else 0},
+        }
+
+    def summary(self):
+        stream = self.wall("stream")
+        parts = [f"{STAGE_LABELS.get(k, k)} {w:.2f}s" for k, (w, _, _) in self.stages.items()
+                 if k not in ("total", "stream") and w >= 0.005]
+        if stream and self.totals["files"]:
+            parts.append(f"{self.totals['files'] / stream:.0f} 文件/s, {self.totals['bytes'] / stream / 1048576:.1f} MB/s")
+        if self.queue: parts.append(f"队列峰值 {max(self.queue)}")
+        return f"{STAGE_LABELS['total']} {self.wall('total'):.2f}s | " + " | ".join(parts)
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.to_dict(), fh, ensure_ascii=False, indent=2)
+
+    def write_chrome(self, path):
+        events = [{"name": name, "ph": "X", "pid": 1, "tid": tid, "ts": (start - self.origin) * 1e6, "dur": dur * 1e6}
+                  for name, start, dur, tid in self.spans]
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump({"traceEvents": events, "otherData": self.to_dict()}, fh, ensure_ascii=False)
+
+
+class NullTrace:
+    def add(self, *args, **kwargs): pass
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def file(self, *args, **kwargs): pass
+
+    def sample_queue(self, depth): pass
+
+    def count(self, files, nbytes): pass
+
+
+NULL_TRACE = NullTrace()
+
+
+@contextmanager
+def profiled(path):
+    if not path:
+        yield
+        return
+    import cProfile
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        prof.dump_stats(path)
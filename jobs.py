@@ -0,0 +1,200 @@
+import os
+import json
+import time
+from pathlib import Path
+
+import deps
+import packager
+import transforms
+from content_cache import default_cache_dir, MemoryCache
+from instrument import Trace
+from scheduler import get_scheduler, BULK
+from selection import SelectionModel
+
+JOB_KEYS = ("fmt", "ign", "gitignore", "rel_path", "compress", "transforms", "transform_opts", "dedup", "max_file",
+            "max_total", "max_tokens", "priority", "exact_tokens", "shard_bytes", "shard_tokens")
+
+
+def jobs_path():
+    return default_cache_dir() / "jobs.json"
+
+
+def load_jobs(path=None):
+    try:
+        with open(path or jobs_path(), encoding="utf-8") as fh: return json.load(fh).get("jobs", [])
+    except (OSError, ValueError):
+        return []
+
+
+def save_jobs(jobs, path=None):
+    path = Path(path or jobs_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"version": 1, "jobs": jobs}, fh, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def put_job(job, path=None):
+    jobs = [j for j in load_jobs(path) if j.get("name") != job["name"]]
+    save_jobs(jobs + [job], path)
+
+
+def job_from_config(name, cfg, selection=None, globs=(), with_deps=False):
+    job = {"name": name, "root": str(Path(cfg['root']).resolve()), "out": str(Path(cfg['out']).resolve()),
+           "manifest": bool(cfg.get('manifest'))}
+    job.update({k: cfg[k] for k in JOB_KEYS if k in cfg})
+    if selection is not None:
+        job.update(include=selection.include_roots(), exclude=selection.exclude_roots())
+    else:
+        job.update(globs=list(globs), deps=bool(with_deps))
+    return job
+
+
+def job_selection(job):
+    sel = SelectionModel()
+    rules = [(p, True) for p in job.get("include", [])] + [(p, False) for p in job.get("exclude", [])]
+    for p, included in sorted(rules): sel.set(p, included)
+    return sel
+
+
+def job_config(job, cache=None):
+    out = Path(job["out"])
+    cfg = {k: job[k] for k in JOB_KEYS if k in job}
+    cfg.update(out=out, root=Path(job["root"]), cache=cache, trace=Trace(),
+               manifest=packager.manifest_path(out) if job.get("manifest", True) else None)
+    cfg.setdefault('ign', packager.parse_ignores(packager.DEFAULT_IGNORES))
+    return cfg
+
+
+def _resolve(job, cfg):
+    gitignore = cfg.get('gitignore', True)
+    if job.get("include"): return packager.resolve_selection(job_selection(job), cfg['ign'], gitignore)
+    files = packager.collect_files(cfg['root'], cfg['ign'], job.get("globs"), gitignore)
+    if job.get("deps") and job.get("globs"): files = deps.closure(files, cfg['root'], cfg['ign'], gitignore)
+    return files
+
+
+def _resolve_timed(job, cfg):
+    t = time.perf_counter()
+    cfg['src'] = _resolve(job, cfg)
+    if not cfg['src']: raise ValueError("没有匹配的文件")
+    return time.perf_counter() - t
+
+
+def _probe_shared(cfgs):
+    known, paths = {}, {}
+    for cfg in cfgs:
+        if cfg.get('manifest'): known.update(packager.load_manifest(cfg['manifest']))
+        for p in map(str, cfg['src']): paths[p] = paths.get(p, 0) + 1
+    shared = [p for p, count in paths.items() if count > 1]
+    return packager.probe_files(shared, known)
+
+
+def _plan(cfg):
+    t = time.perf_counter()
+    entries = packager.prepare_entries(cfg)
+    return entries, time.perf_counter() - t
+
+
+def _warm_batch(items):
+    for e, max_file, users in items:
+        raw = packager.read_raw(e, max_file)
+        if raw is None: continue
+        for key, cfg in users.items():
+            names = transforms.pipeline_for(cfg)
+            content = transforms.apply(raw, e['ext'], names, cfg.get('transform_opts')) if names else raw
+            cfg['cache'].put(e['src'], e['size'], e['mtime_ns'], content, key)
+
+
+def _warm(prepared):
+    owners = {}
+    for cfg, entries in prepared:
+        key_for = packager.cache_key_fn(cfg)
+        max_file = cfg.get('max_file', packager.DEFAULT_MAX_FILE)
+        for e in entries:
+            group = owners.setdefault((e['src'], max_file), [e, 0, {}])
+            group[1] += 1
+            group[2].setdefault(key_for(e), cfg)
+    shared = [(e, max_file, users) for (_, max_file), (e, count, users) in owners.items() if count > 1]
+    sched = get_scheduler()
+    jobs = [sched.submit(_warm_batch, shared[i:i + transforms.BATCH_FILES], priority=BULK)
+            for i in range(0, len(shared), transforms.BATCH_FILES)]
+    for job in jobs: sched.result(job)
+    return len(shared)
+
+
+def _run(cfg, entries):
+    t = time.perf_counter()
+    return packager.build_package(cfg, entries), time.perf_counter() - t
+
+
+def _configs(jobs, results, cache):
+    cfgs, outs = {}, {}
+    for i, (job, res) in enumerate(zip(jobs, results)):
+        try:
+            cfgs[i] = job_config(job, cache)
+        except Exception as e:
+            res["error"] = f"任务配置无效: {e!r}"
+            continue
+        outs.setdefault(os.path.normcase(str(cfgs[i]['out'].resolve())), []).append(i)
+    for same in outs.values():
+        if len(same) < 2: continue
+        names = ", ".join(results[i]["name"] for i in same)
+        for i in same:
+            results[i]["error"] = f"多个任务输出到同一文件 ({names})"
+            del cfgs[i]
+    return cfgs
+
+
+def build_all(jobs, backing=None):
+    t0 = time.perf_counter()
+    cache = MemoryCache(backing)
+    sched = get_scheduler()
+    results = [{"name": job.get("name", "?"), "out": job.get("out"), "error": None} for job in jobs]
+    cfgs = _configs(jobs, results, cache)
+    pending = [(i, sched.submit(_resolve_timed, jobs[i], cfg, priority=BULK)) for i, cfg in cfgs.items()]
+    resolved = {}
+    for i, job in pending:
+        try:
+            results[i]["prepare"] = sched.result(job)
+            resolved[i] = cfgs[i]
+        except Exception as e:
+            results[i]["error"] = str(e)
+    probed = _probe_shared(resolved.values())
+    for cfg in resolved.values(): cfg['probed'] = probed
+    pending = [(i, sched.submit(_plan, cfg, priority=BULK)) for i, cfg in resolved.items()]
+    prepared = []
+    for i, job in pending:
+        try:
+            entries, seconds = sched.result(job)
+            results[i]["prepare"] += seconds
+            prepared.append((results[i], resolved[i], entries))
+        except Exception as e:
+            results[i]["error"] = str(e)
+    shared = _warm([(cfg, entries) for _, cfg, entries in prepared])
+    pending = [(res, cfg, entries, sched.submit(_run, cfg, entries, priority=BULK)) for res, cfg, entries in prepared]
+    for res, cfg, entries, job in pending:
+        try:
+            res["out"], res["build"] = sched.result(job)
+            res.update(files=len(entries), tokens=cfg['report'].get('tokens', 0), shards=cfg['report'].get('shards'),
+                       seconds=res["prepare"] + res["build"], summary=cfg['trace'].summary())
+        except Exception as e:
+            res["error"] = str(e)
+    cache.flush()
+    return {"jobs": results, "seconds": time.perf_counter() - t0, "shared": shared, "cache": cache.stats()}
+
+
+def format_results(summary):
+    lines = []
+    for res in summary["jobs"]:
+        if res["error"]:
+            lines.append(f"✗ {res['name']}: {res['error']}")
+            continue
+        shards = f", {res['shards']} 个分片" if res.get("shards") else ""
+        lines.append(f"✓ {res['name']}: {res['files']} 个文件, 约 {res['tokens']:,} tokens{shards}, "
+                     f"{res['seconds']:.2f} 秒 → {res['out']}")
+    cache = summary["cache"]
+    lines.append(f"共 {len(summary['jobs'])} 个任务, 总计 {summary['seconds']:.2f} 秒; "
+                 f"共享文件 {summary['shared']} 个, 内存缓存命中 {cache['hits']} 次")
+    return "\n".join(lines)
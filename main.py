@@ -1,16 +1,24 @@
 import sys
 import os
-import re
+import datetime
+import itertools
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import customtkinter as ctk
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import fnmatch
 
+import packager
+import tokens
+from dir_cache import DirListingCache
+from selection import SelectionStats
+from ignore_rules import compile_ignores
 from theme import Material3
-from async_utils import AsyncEngine
+from async_utils import AsyncEngine, BACKGROUND, BULK
 from widgets import ModernFileTree
+from instrument import Trace, profiled
+
+FIRST_SCAN_ROWS = 256
+SIDEBAR_PAGE = 40
 
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("dark-blue")
@@ -22,17 +30,98 @@ class ModernApp(ctk.CTk):
         self._center_window(1000, 700) 
         
         self.engine = AsyncEngine(self)
+        self.dir_cache = DirListingCache()
+        self.sel_stats = SelectionStats()
+        self._summary_inflight = set()
+        self._sel_view = (None, [], False)
+        self._gen_task = None
+        self._index = {'busy': False, 'dirty': False, 'root': None, 'query': None}
+        self._watch = None
+        self._watch_state = {}
+        self._watch_busy = False
+        self._watch_key = None
+        self.sel_page = 0
+        self._sel_rows = []
         self.workspace_root = Path.cwd()
         self.current_path = Path.cwd()
         self.history_stack = []
         self.output_dir = Path.cwd() / "output"
         self.output_dir.mkdir(exist_ok=True)
+        self.content_cache = None
+        self.search_index = None
         
         self.configure(fg_color=Material3.pair("bg"))
         self._init_ui()
+        self.sel_stats.reset(self._selection_config())
         
         self.addr_bar.insert(0, str(self.workspace_root))
+        self.bind("<FocusIn>", self._on_focus_in)
+        self.after_idle(self._deferred_init)
+
+    def _deferred_init(self):
         self.navigate(self.workspace_root)
+        self.engine.run(self._open_cache, self._cache_ready, priority=BACKGROUND)
+
+    def _open_cache(self):
+        from content_cache import ContentCache
+        from search_index import SearchIndex
+        opened = []
+        for cls in (ContentCache, SearchIndex):
+            try: opened.append(cls())
+            except Exception: opened.append(None)
+        return opened
+
+    def _cache_ready(self, opened):
+        self.content_cache, self.search_index = opened
+
+    def _refresh_index(self):
+        if self.search_index is None: return
+        if self._index['busy']:
+            self._index['dirty'] = True
+            return
+        self._index.update(busy=True, dirty=False)
+        ignores, gitignore = self._selection_config()
+        self.engine.run(self._index_worker, self._index_done, self.workspace_root, list(ignores), gitignore,
+                        channel="index", priority=BACKGROUND, with_task=True, on_cancel=self._index_done,
+                        on_error=lambda msg: self._index_done())
+
+    def _index_worker(self, task, root, ignores, gitignore):
+        self.search_index.update(root, ignores, gitignore, check=task.check)
+        return root
+
+    def _index_done(self, root=None):
+        self._index['busy'] = False
+        if root is not None: self._index['root'] = root
+        if self._index['dirty']: return self._refresh_index()
+        query, self._index['query'] = self._index['query'], None
+        if query and self._index['root'] == self.workspace_root: self._run_search(query)
+
+    def search_select(self):
+        query = self.search_entry.get().strip()
+        if not query: return
+        if self.search_index is None:
+            return self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | 搜索索引尚未就绪")
+        from search_index import MIN_QUERY
+        if len(query) < MIN_QUERY:
+            return self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | 至少输入 {MIN_QUERY} 个字符")
+        if self._index['root'] != self.workspace_root:
+            self._index['query'] = query
+            if not self._index['busy']: self._refresh_index()
+            return self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | 正在建立搜索索引…")
+        self._run_search(query)
+
+    def _run_search(self, query):
+        self.engine.run(self.search_index.search, self._search_done, self.workspace_root, query, channel="search")
+
+    def _search_done(self, paths):
+        for p in paths: self.file_tree.selection.set(p, True)
+        if paths:
+            self.file_tree.bulk_update_visuals()
+            self.update_selection_ui()
+        pending = " (索引更新中…)" if self._index['busy'] else ""
+        self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | "
+                                       f"“{self.search_entry.get().strip()}” 匹配 {len(paths)} 个文件{pending}")
+        self._refresh_index()
 
     def _center_window(self, w, h):
         screen_width = self.winfo_screenwidth()
@@ -85,28 +174,55 @@ class ModernApp(ctk.CTk):
         ctk.CTkCheckBox(opt_box, text="写入相对路径", variable=self.rel_path_var, font=("Microsoft YaHei UI", 12),
                       text_color=Material3.pair("text"), fg_color=Material3.pair("primary")).pack(anchor="w", pady=2)
         
+        self.gitignore_var = ctk.BooleanVar(value=True)
+        ctk.CTkCheckBox(opt_box, text="遵循 .gitignore", variable=self.gitignore_var, font=("Microsoft YaHei UI", 12),
+                      text_color=Material3.pair("text"), fg_color=Material3.pair("primary")).pack(anchor="w", pady=2)
+
         self.compress_var = ctk.BooleanVar(value=False)
         ctk.CTkCheckBox(opt_box, text="压缩空行/回车", variable=self.compress_var, font=("Microsoft YaHei UI", 12),
                       text_color=Material3.pair("text"), fg_color=Material3.pair("primary")).pack(anchor="w", pady=2)
 
+        self.dedup_var = ctk.BooleanVar(value=True)
+        ctk.CTkCheckBox(opt_box, text="合并重复文件", variable=self.dedup_var, font=("Microsoft YaHei UI", 12),
+                      text_color=Material3.pair("text"), fg_color=Material3.pair("primary")).pack(anchor="w", pady=2)
+
+        self.delta_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(opt_box, text="仅输出变更 (对比上次清单)", variable=self.delta_var, font=("Microsoft YaHei UI", 12),
+                      text_color=Material3.pair("text"), fg_color=Material3.pair("primary")).pack(anchor="w", pady=2)
+
+        self.watch_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(opt_box, text="监视变更并自动更新", variable=self.watch_var, font=("Microsoft YaHei UI", 12),
+                      text_color=Material3.pair("text"), fg_color=Material3.pair("primary"),
+                      command=self._toggle_watch).pack(anchor="w", pady=2)
+
+        self.strip_comments_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(opt_box, text="去除注释", variable=self.strip_comments_var, font=("Microsoft YaHei UI", 12),
+                      text_color=Material3.pair("text"), fg_color=Material3.pair("primary")).pack(anchor="w", pady=2)
+
+        self.truncate_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(opt_box, text="截断超长行", variable=self.truncate_var, font=("Microsoft YaHei UI", 12),
+                      text_color=Material3.pair("text"), fg_color=Material3.pair("primary")).pack(anchor="w", pady=2)
+
         self._lbl(self.sidebar, "忽略规则")
         self.ign_box = ctk.CTkTextbox(self.sidebar, height=70, corner_radius=15, border_width=0,
                                     fg_color=Material3.pair("surface_variant"),
                                     text_color=Material3.pair("text"))
         self.ign_box.pack(fill="x", padx=20, pady=5)
         
-        default_ignores = (
-            "node_modules;.git;.svn;.hg;.idea;.vscode;.DS_Store;dist;build;coverage;venv;.env;"
-            "__pycache__;*.pyc;*.pyo;*.pyd;*.class;"
-            "*.exe;*.dll;*.so;*.dylib;*.bin;*.msi;*.apk;*.ipa;*.iso;*.img;*.dmg;"
-            "*.zip;*.tar;*.gz;*.rar;*.7z;*.jar;*.war;*.ear;*.bz2;*.xz;"
-            "*.png;*.jpg;*.jpeg;*.gif;*.bmp;*.ico;*.svg;*.tiff;*.webp;*.psd;*.ai;*.eps;*.icns;"
-            "*.mp3;*.mp4;*.wav;*.avi;*.mov;*.flv;*.wmv;*.mkv;*.m4a;*.flac;"
-            "*.pdf;*.doc;*.docx;*.xls;*.xlsx;*.ppt;*.pptx;*.odt;*.ods;"
-            "*.ttf;*.otf;*.woff;*.woff2;*.eot;"
-            "*.blend;*.fbx;*.obj;*.stl;*.max;*.ma;*.mb"
-        )
-        self.ign_box.insert("0.0", default_ignores)
+        self.ign_box.insert("0.0", packager.DEFAULT_IGNORES)
+
+        self._lbl(self.sidebar, "Token 预算 / 分片上限 (留空不限)")
+        tok_box = ctk.CTkFrame(self.sidebar, fg_color="transparent")
+        tok_box.pack(fill="x", padx=20, pady=(5, 5))
+        self.budget_entry = ctk.CTkEntry(tok_box, height=32, width=110, corner_radius=16, border_width=0,
+                                       placeholder_text="预算", fg_color=Material3.pair("surface_variant"),
+                                       text_color=Material3.pair("text"))
+        self.budget_entry.pack(side="left", fill="x", expand=True)
+        self.budget_entry.bind("<KeyRelease>", lambda e: self.engine.post(self._update_counters, key="counters"))
+        self.shard_entry = ctk.CTkEntry(tok_box, height=32, width=110, corner_radius=16, border_width=0,
+                                      placeholder_text="每片", fg_color=Material3.pair("surface_variant"),
+                                      text_color=Material3.pair("text"))
+        self.shard_entry.pack(side="right", fill="x", expand=True, padx=(8, 0))
 
         sel_header = ctk.CTkFrame(self.sidebar, fg_color="transparent")
         sel_header.pack(fill="x", padx=20, pady=(20, 5))
@@ -120,9 +236,34 @@ class ModernApp(ctk.CTk):
                                      font=("Microsoft YaHei UI", 11), command=self.clear_all_selection)
         self.clear_btn.pack(side="right")
 
+        self.deps_btn = ctk.CTkButton(sel_header, text="🔗 依赖", width=60, height=24, corner_radius=12,
+                                    fg_color=Material3.pair("surface_variant"),
+                                    text_color=Material3.pair("text"),
+                                    hover_color=Material3.pair("outline"),
+                                    font=("Microsoft YaHei UI", 11), command=self.include_dependencies)
+        self.deps_btn.pack(side="right", padx=(0, 5))
+
+        self.page_next_btn = self._page_btn(sel_header, "›", 1)
+        self.page_lbl = ctk.CTkLabel(sel_header, text="", font=("Microsoft YaHei UI", 11),
+                                   text_color=Material3.pair("text_dim"))
+        self.page_lbl.pack(side="right")
+        self.page_prev_btn = self._page_btn(sel_header, "‹", -1)
+
+        self.token_lbl = ctk.CTkLabel(self.sidebar, text="", anchor="w", font=("Microsoft YaHei UI", 11),
+                                    text_color=Material3.pair("text_dim"))
+        self.token_lbl.pack(fill="x", padx=20)
+
         self.sel_list_frame = ctk.CTkScrollableFrame(self.sidebar, fg_color="transparent")
         self.sel_list_frame.pack(fill="both", expand=True, padx=10, pady=(5, 10))
 
+    def _page_btn(self, p, t, step):
+        btn = ctk.CTkButton(p, text=t, width=24, height=24, corner_radius=12,
+                          fg_color="transparent", text_color=Material3.pair("text"),
+                          hover_color=Material3.pair("surface_variant"),
+                          command=lambda: self._turn_sel_page(step))
+        btn.pack(side="right", padx=2)
+        return btn
+
     def _lbl(self, p, t):
         ctk.CTkLabel(p, text=t, font=("Microsoft YaHei UI", 12, "bold"), 
                    text_color=Material3.pair("secondary")).pack(anchor="w", padx=20, pady=(15, 0))
@@ -136,12 +277,19 @@ class ModernApp(ctk.CTk):
         
         self._nav_btn(nav, "⬅", self.go_back)
         self._nav_btn(nav, "⬆", self.go_up)
+        self._nav_btn(nav, "🔄", self.refresh)
         
         self.addr_bar = ctk.CTkEntry(nav, height=36, corner_radius=18, border_width=0,
                                    fg_color=Material3.pair("surface"),
                                    text_color=Material3.pair("text"))
         self.addr_bar.pack(side="left", fill="x", expand=True, padx=10)
         self.addr_bar.bind("<Return>", lambda e: self.navigate_and_set_root(Path(self.addr_bar.get())))
+
+        self.search_entry = ctk.CTkEntry(nav, height=36, width=200, corner_radius=18, border_width=0,
+                                       placeholder_text="🔍 搜索内容并全选", fg_color=Material3.pair("surface"),
+                                       text_color=Material3.pair("text"))
+        self.search_entry.pack(side="left", padx=(0, 10))
+        self.search_entry.bind("<Return>", lambda e: self.search_select())
         
         self._nav_btn(nav, "📂 设置根目录", self.browse_folder, width=100)
 
@@ -162,6 +310,21 @@ class ModernApp(ctk.CTk):
                                       command=self.start_process)
         self.action_btn.pack(side="right", padx=10)
 
+        self.build_all_btn = ctk.CTkButton(self.bottom_bar, text="📦 全部生成", height=38, width=100, corner_radius=19,
+                                         fg_color=Material3.pair("surface_variant"), text_color=Material3.pair("text"),
+                                         hover_color=Material3.pair("outline"), command=self.build_all_jobs)
+        self.build_all_btn.pack(side="right", padx=(10, 0))
+        ctk.CTkButton(self.bottom_bar, text="💾 保存任务", height=38, width=100, corner_radius=19,
+                      fg_color=Material3.pair("surface_variant"), text_color=Material3.pair("text"),
+                      hover_color=Material3.pair("outline"), command=self.save_job).pack(side="right")
+        self.progress_bar = None
+
+    def _progress(self):
+        if self.progress_bar is None:
+            self.progress_bar = ctk.CTkProgressBar(self.bottom_bar, width=160, height=8,
+                                                 progress_color=Material3.pair("primary"))
+        return self.progress_bar
+
     def _nav_btn(self, p, t, c, width=40):
         ctk.CTkButton(p, text=t, width=width, height=36, corner_radius=18,
                     fg_color=Material3.pair("surface"), text_color=Material3.pair("text"),
@@ -174,118 +337,179 @@ class ModernApp(ctk.CTk):
         self.current_path = path
         self.addr_bar.delete(0, tk.END)
         self.addr_bar.insert(0, str(path))
-        self.engine.run(self._scan, self.file_tree.populate, path)
+        cached = self.dir_cache.get(path)
+        if cached is not None:
+            self.file_tree.populate(cached)
+            self.engine.run(self.dir_cache.revalidate, self._apply_listing_diff, path, channel="scan")
+        else:
+            self.engine.run(self._scan, self._scan_done, path, FIRST_SCAN_ROWS, channel="scan")
 
     def navigate_and_set_root(self, path):
         self.workspace_root = path
         self.status_lbl.configure(text=f"工作区: {self.workspace_root.name}")
         self.navigate(path)
+        self._refresh_index()
+
+    def _scan(self, path, limit=None):
+        return path, self.dir_cache.scan(path, limit), limit
 
-    def _scan(self, path):
-        data = []
-        try:
-            with os.scandir(path) as it:
-                for e in it:
-                    if e.name.startswith('.'): continue
-                    sz = ""
-                    if not e.is_dir():
-                        try: sz = f"{e.stat().st_size/1024:.1f} KB"
-                        except: sz = "N/A"
-                    mtime = ""
-                    try: 
-                        import datetime
-                        mtime = datetime.datetime.fromtimestamp(e.stat().st_mtime).strftime('%Y-%m-%d')
-                    except: pass
-                    data.append({
-                        "name": e.name, "path": str(e.path), "is_dir": e.is_dir(),
-                        "size_str": sz, "date": mtime
-                    })
-        except: pass
-        return data
+    def _scan_done(self, result):
+        path, items, limit = result
+        self.file_tree.populate(items)
+        if limit is not None and len(items) >= limit:
+            self.engine.run(self._scan, self._scan_done, path, channel="scan")
+
+    def _apply_listing_diff(self, result):
+        path, added, removed, changed = result
+        if path != str(self.current_path): return
+        if added or removed or changed:
+            self.file_tree.patch(added, removed, changed)
+
+    def _on_focus_in(self, event):
+        if event.widget is not self: return
+        self._revalidate()
+
+    def _revalidate(self):
+        if self.dir_cache.get(self.current_path) is not None:
+            self.engine.run(self.dir_cache.revalidate, self._apply_listing_diff, self.current_path, channel="scan")
+
+    def refresh(self):
+        self.dir_cache.invalidate(self.current_path)
+        self._revalidate()
 
     def on_tree_toggle(self, item_path, is_selecting, recursive=False):
-        if not recursive:
-            self.update_selection_ui()
-        
-        if recursive and item_path:
-            self.status_lbl.configure(text="正在处理..." if is_selecting else "正在移除...")
-            ignores = self.ign_box.get("0.0", "end").replace("\n", ";").split(";")
-            
-            task_args = {
-                "root": item_path,
-                "is_selecting": is_selecting,
-                "ignores": [x.strip() for x in ignores if x.strip()]
-            }
-            self.engine.run(self._recursive_worker, self._recursive_done, task_args)
-
-    def _recursive_worker(self, args):
-        root = Path(args["root"])
-        is_selecting = args["is_selecting"]
-        ignores = args["ignores"]
-        
-        def is_ign(p): return any(fnmatch.fnmatch(Path(p).name, x) for x in ignores)
-        
-        affected_items = set()
-        try:
-            affected_items.add(str(root))
-            for parent, dirs, files in os.walk(root):
-                dirs[:] = [d for d in dirs if not is_ign(os.path.join(parent, d))]
-                for f in files:
-                    if not is_ign(f):
-                        affected_items.add(os.path.join(parent, f))
-                for d in dirs:
-                    affected_items.add(os.path.join(parent, d))
-        except Exception: pass
-        return affected_items, is_selecting
-
-    def _recursive_done(self, result):
-        affected_items, is_selecting = result
-        if is_selecting:
-            self.file_tree.selection_map.update(affected_items)
-        else:
-            self.file_tree.selection_map.difference_update(affected_items)
-        
-        self.file_tree.bulk_update_visuals(affected_items)
+        item = self.file_tree.current_items_map.get(item_path) if item_path else None
+        if item and not item['is_dir']: self.sel_stats.note_file(item_path, item['size'])
+        if recursive: self.file_tree.bulk_update_visuals()
         self.update_selection_ui()
 
+    def _selection_config(self):
+        return tuple(packager.parse_ignores(self.ign_box.get("0.0", "end"))), self.gitignore_var.get()
+
     def update_selection_ui(self):
-        count = len([x for x in self.file_tree.selection_map if not x.endswith(os.sep) and os.path.isfile(x)])
-        
-        self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | 已选 {count} 个文件")
-        
-        for w in self.sel_list_frame.winfo_children(): w.destroy()
-        
-        LIMIT = 40 
-        
-        display_files = []
-        i = 0
-        for p in self.file_tree.selection_map:
-            if os.path.isfile(p):
-                display_files.append(p)
-                i += 1
-                if i >= LIMIT: break
-
-        for path_str in display_files:
+        if self._watch is not None: self._start_watch()
+        config = self._selection_config()
+        if self.sel_stats.config != config:
+            self.sel_stats.reset(config)
+            self._summary_inflight.clear()
+        self._update_counters()
+        self.engine.post(self._refresh_sidebar, key="sidebar")
+
+    def _update_counters(self):
+        config = self.sel_stats.config
+        count, size, pending = self.sel_stats.totals(self.file_tree.selection, compile_ignores(config[0]))
+        fresh = [p for p in pending if p not in self._summary_inflight]
+        if fresh:
+            self._summary_inflight.update(fresh)
+            self.engine.run(self._summary_worker, self._summary_done, fresh, config, priority=BACKGROUND)
+        more = " …" if pending else ""
+        self.status_lbl.configure(
+            text=f"工作区: {self.workspace_root.name} | 已选 {count}{more} 个文件 ({packager.format_size(size)})")
+        est, budget = tokens.estimate_bytes(size), self._token_budget()
+        self.token_lbl.configure(text=f"≈ {est:,}{more} tokens" + (f" / 预算 {budget:,}" if budget else ""),
+                                 text_color=Material3.pair("error" if budget and est > budget else "text_dim"))
+
+    def _token_budget(self, entry=None):
+        text = (entry or self.budget_entry).get().strip().replace(",", "")
+        return int(text) if text.isdigit() else 0
+
+    def _summary_worker(self, paths, config):
+        summary, files = {}, {}
+        for p in paths:
+            if os.path.isdir(p):
+                progress = lambda partial: self.engine.post(self._summary_progress, config, partial, key=("summary", p))
+                summary.update(packager.walk_summary(p, list(config[0]), config[1], progress))
+                continue
+            try: files[p] = os.stat(p).st_size
+            except OSError: files[p] = None
+        return paths, config, summary, files
+
+    def _summary_progress(self, config, partial):
+        if config != self.sel_stats.config: return
+        self.sel_stats.add_partial(partial)
+        self.engine.post(self._update_counters, key="counters")
+
+    def _summary_done(self, result):
+        paths, config, summary, files = result
+        if config != self.sel_stats.config: return
+        self._summary_inflight.difference_update(paths)
+        self.sel_stats.add_summary(summary, files)
+        self.engine.post(self._update_counters, key="counters")
+
+    def _refresh_sidebar(self):
+        key = (self.file_tree.selection.version, self.sel_stats.config, self.sel_page)
+        if self._sel_view[0] == key: return self._render_sel_page()
+        self.engine.run(self._resolve_worker, self._resolve_done, key, self.file_tree.selection.copy(),
+                        channel="resolve", priority=BACKGROUND, with_task=True)
+
+    def _resolve_worker(self, task, key, selection):
+        (ignores, gitignore), start = key[1], key[2] * SIDEBAR_PAGE
+        files = list(itertools.islice(packager.iter_selection(selection, list(ignores), gitignore, task.check),
+                                      start + SIDEBAR_PAGE + 1))
+        return key, files[start:start + SIDEBAR_PAGE], len(files) > start + SIDEBAR_PAGE, len(files)
+
+    def _resolve_done(self, result):
+        key, page, more, seen = result
+        if not page and key[2] > 0:
+            self.sel_page = (seen - 1) // SIDEBAR_PAGE if seen else 0
+            return self._refresh_sidebar()
+        self._sel_view = (key, page, more)
+        self._render_sel_page()
+
+    def _turn_sel_page(self, step):
+        self.sel_page = max(0, self.sel_page + step)
+        self._refresh_sidebar()
+
+    def _render_sel_page(self):
+        _, page, more = self._sel_view
+
+        while len(self._sel_rows) < len(page):
             row = ctk.CTkFrame(self.sel_list_frame, fg_color="transparent", height=28)
-            row.pack(fill="x", pady=1)
-            
-            ctk.CTkButton(row, text="✕", width=20, height=20, corner_radius=10,
-                        fg_color="transparent", text_color=Material3.pair("error"), hover_color=Material3.pair("surface_variant"),
-                        command=lambda x=path_str: self.file_tree.remove_specific(x)).pack(side="right")
-            
-            d_name = Path(path_str).name
-
-            ctk.CTkLabel(row, text=d_name, anchor="w", font=("Microsoft YaHei UI", 11),
-                       text_color=Material3.pair("text")).pack(side="left", fill="x", expand=True)
-
-        if count > LIMIT:
-             ctk.CTkLabel(self.sel_list_frame, text=f"...以及其他 {count - LIMIT} 个文件", 
-                        font=("Microsoft YaHei UI", 11, "italic"),
-                        text_color=Material3.pair("primary")).pack(pady=5)
+            btn = ctk.CTkButton(row, text="✕", width=20, height=20, corner_radius=10,
+                              fg_color="transparent", text_color=Material3.pair("error"), hover_color=Material3.pair("surface_variant"))
+            btn.pack(side="right")
+            lbl = ctk.CTkLabel(row, text="", anchor="w", font=("Microsoft YaHei UI", 11),
+                             text_color=Material3.pair("text"))
+            lbl.pack(side="left", fill="x", expand=True)
+            self._sel_rows.append((row, lbl, btn))
+
+        for i, (row, lbl, btn) in enumerate(self._sel_rows):
+            if i < len(page):
+                path_str = page[i]
+                lbl.configure(text=Path(path_str).name)
+                btn.configure(command=lambda x=path_str: self.file_tree.remove_specific(x))
+                if not row.winfo_manager(): row.pack(fill="x", pady=1)
+            elif row.winfo_manager():
+                row.pack_forget()
+
+        self.page_lbl.configure(text=f"第 {self.sel_page + 1} 页" if more or self.sel_page else "")
+        self.page_prev_btn.configure(state="normal" if self.sel_page else "disabled")
+        self.page_next_btn.configure(state="normal" if more else "disabled")
 
     def clear_all_selection(self):
         self.file_tree.clear_selection()
 
+    def include_dependencies(self):
+        if not self.file_tree.selection: return messagebox.showwarning("提示", "请至少选择一个文件")
+        ignores, gitignore = self._selection_config()
+        self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | 正在分析依赖…")
+        self.engine.run(self._deps_worker, self._deps_done, self.file_tree.selection.copy(), list(ignores), gitignore,
+                        self.workspace_root, channel="deps")
+
+    def _deps_worker(self, selection, ignores, gitignore, root):
+        import deps
+        files = packager.resolve_selection(selection, ignores, gitignore)
+        starts = [f for f in files if deps.supported(f)]
+        chosen = set(map(os.path.abspath, files))
+        return [p for p in deps.closure(starts, root, ignores, gitignore) if p not in chosen]
+
+    def _deps_done(self, added):
+        for p in added: self.file_tree.selection.set(p, True)
+        if added:
+            self.file_tree.bulk_update_visuals()
+            self.update_selection_ui()
+        self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | 已加入 {len(added)} 个依赖文件")
+
     def _on_fmt_change(self):
         current = self.name_entry.get()
         if not current: return
@@ -311,110 +535,205 @@ class ModernApp(ctk.CTk):
             self.workspace_root = p
             self.status_lbl.configure(text=f"工作区: {self.workspace_root.name}")
             self.navigate(p)
+            self._refresh_index()
 
     def start_process(self):
-        all_items = list(self.file_tree.selection_map)
-        files = [x for x in all_items if os.path.isfile(x)]
-        
-        if not files: return messagebox.showwarning("提示", "请至少选择一个文件")
+        if self._gen_task is not None: return self.cancel_process()
+        if not self.file_tree.selection: return messagebox.showwarning("提示", "请至少选择一个文件")
         
-        self.action_btn.configure(state="disabled", text="⏳ 生成中...")
-        cfg = {
-            'out': self.output_dir / self.name_entry.get(),
+        self.action_btn.configure(text="⏹ 取消")
+        self._progress().set(0)
+        self.progress_bar.pack(side="right", padx=10)
+        cfg = self._build_cfg()
+        self._gen_task = self.engine.run(self._worker, self._done, cfg, channel="generate", priority=BULK, with_task=True,
+                                         on_progress=self._on_progress, on_cancel=self._on_cancelled,
+                                         on_error=lambda msg: self._reset_action())
+
+    def _build_cfg(self):
+        out = self.output_dir / self.name_entry.get()
+        return {
+            'out': out,
             'fmt': self.fmt_var.get(),
-            'ign': self.ign_box.get("0.0", "end").replace("\n", ";").split(";"),
-            'src': files,
+            'ign': packager.parse_ignores(self.ign_box.get("0.0", "end")),
+            'selection': self.file_tree.selection.copy(),
+            'gitignore': self.gitignore_var.get(),
             'root': self.workspace_root,
             'rel_path': self.rel_path_var.get(),
-            'compress': self.compress_var.get()
+            'compress': self.compress_var.get(),
+            'transforms': [name for name, var in (("strip_comments", self.strip_comments_var),
+                                                  ("truncate_lines", self.truncate_var)) if var.get()],
+            'dedup': self.dedup_var.get(),
+            'max_tokens': self._token_budget(),
+            'shard_tokens': self._token_budget(self.shard_entry),
+            'manifest': packager.manifest_path(out),
+            'delta': packager.manifest_path(out) if self.delta_var.get() else None,
+            'cache': self.content_cache,
+            'trace': Trace(spans=bool(os.environ.get("PROMPT_PACKAGER_TRACE")))
         }
-        self.engine.run(self._worker, self._done, cfg)
 
-    def _worker(self, cfg):
-        is_xml = cfg['fmt'] == 'xml'
-        ignores = [x.strip() for x in cfg['ign'] if x.strip()]
-        
-        calc_root = cfg['root']
-        if cfg['rel_path'] and cfg['src']:
-            try:
-                common = os.path.commonpath(cfg['src'])
-                if common:
-                    common_p = Path(common)
-                    if not str(common_p).startswith(str(cfg['root'])):
-                        calc_root = common_p
-            except: pass
-
-        def is_ign(p): return any(fnmatch.fnmatch(Path(p).name, x) for x in ignores)
-        
-        def read_one_file(f_path_str):
-            p = Path(f_path_str)
-            if is_ign(p): return None
-            try:
-                content = p.read_text(encoding='utf-8', errors='ignore')
-                if cfg['compress']:
-                    content = re.sub(r'\n\s*\n', '\n', content)
-                
-                display_path = p.name
-                if cfg['rel_path']:
-                    try:
-                        display_path = os.path.relpath(f_path_str, cfg['root']).replace("\\", "/")
-                        if display_path.startswith("..") and display_path.count("..") > 2:
-                             display_path = os.path.relpath(f_path_str, calc_root).replace("\\", "/")
-                    except: pass
-                
-                return {
-                    "path": display_path,
-                    "content": content,
-                    "ext": p.suffix[1:] if p.suffix else "txt"
-                }
-            except: return None
-
-        processed_files = []
-        max_w = min(64, (os.cpu_count() or 4) * 8) 
-        with ThreadPoolExecutor(max_workers=max_w) as executor:
-            futures = [executor.submit(read_one_file, f) for f in cfg['src']]
-            for future in as_completed(futures):
-                res = future.result()
-                if res: processed_files.append(res)
-        
-        buf = []
-        
-        if is_xml:
-            buf.append("<project_context>")
-            buf.append("  <file_tree>")
-            for f in processed_files:
-                buf.append(f'    <file path="{f["path"]}" />')
-            buf.append("  </file_tree>")
-            
-            buf.append("  <source_code>")
-            for f in processed_files:
-                safe_content = f['content'].replace("]]>", "]]]]><![CDATA[>")
-                buf.append(f'    <file path="{f["path"]}">')
-                buf.append(f'<![CDATA[\n{safe_content}\n]]>')
-                buf.append('    </file>')
-            buf.append("  </source_code>")
-            buf.append("</project_context>")
-        else:
-            buf.append("# Project Source Code Context")
-            buf.append("\n## File Tree")
-            for f in processed_files:
-                buf.append(f"- {f['path']}")
-            
-            buf.append("\n" + "="*40 + "\n")
-            
-            for f in processed_files:
-                buf.append(f"## File: {f['path']}")
-                buf.append(f"```{f['ext']}")
-                buf.append(f['content'])
-                buf.append("```\n")
-
-        cfg['out'].write_text("\n".join(buf), encoding='utf-8')
-        return str(cfg['out'])
-
-    def _done(self, path):
+    def cancel_process(self):
+        if self._gen_task is not None:
+            self._gen_task.cancel()
+            self.action_btn.configure(state="disabled", text="⏳ 取消中...")
+
+    def _worker(self, task, cfg):
+        with profiled(os.environ.get("PROMPT_PACKAGER_PROFILE")):
+            with cfg['trace'].stage("resolve"):
+                cfg['src'] = packager.resolve_selection(cfg['selection'], cfg['ign'], cfg['gitignore'])
+            task.check()
+            if not cfg['src']: return None
+            cfg['progress'] = task.progress
+            path = packager.build_package(cfg)
+        if os.environ.get("PROMPT_PACKAGER_TRACE"): cfg['trace'].write_chrome(os.environ["PROMPT_PACKAGER_TRACE"])
+        return path, cfg['report'], cfg['trace']
+
+    def _on_progress(self, info):
+        self.progress_bar.set(info["fraction"])
+        eta = f" | 剩余约 {info['eta']:.0f} 秒" if info["eta"] is not None else ""
+        self.status_lbl.configure(text=f"已读取 {info['done']}/{info['total']} 个文件 "
+                                       f"({packager.format_size(info['bytes'])}){eta}")
+
+    def _reset_action(self):
+        self._gen_task = None
+        self._progress().pack_forget()
         self.action_btn.configure(state="normal", text="🚀 开始生成")
-        messagebox.showinfo("完成", f"文件已生成:\n{path}")
+        if self._watch is not None and self._watch_state.get('pending'): self.engine.post(self._watch_regen, key="watch")
+
+    def _on_cancelled(self):
+        self._reset_action()
+        self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | 已取消生成")
+
+    def _done(self, result):
+        self._reset_action()
+        self._update_counters()
+        if result is None: return messagebox.showwarning("提示", "请至少选择一个文件")
+        path, report, trace = result
+        self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | {trace.summary()}")
+        messagebox.showinfo("完成", f"文件已生成:\n{path}{self._report_text(report)}")
+
+    def _report_text(self, report):
+        notes = [f"{label} {report[k]} 个" for k, label in (("binary", "跳过二进制"), ("over_limit", "超出总量"),
+                                                           ("truncated", "截断大文件")) if report.get(k)]
+        if report.get('dropped') or report.get('token_truncated'):
+            notes.append(f"超出 Token 预算: 丢弃 {report['dropped']} 个, 截断 {report['token_truncated']} 个")
+        if 'added' in report:
+            notes.append(f"新增 {report['added']} 个, 修改 {report['modified']} 个, 删除 {report['deleted']} 个")
+        if report.get('dup_files'):
+            notes.append(f"重复文件 {report['dup_files']} 个, 节省 {packager.format_size(report['dup_bytes'])}")
+        notes.append(f"约 {report.get('tokens', 0):,} tokens")
+        if report.get('shards'): notes.append(f"共 {report['shards']} 个分片")
+        return "\n\n" + ", ".join(notes)
+
+    def save_job(self):
+        if not self.file_tree.selection: return messagebox.showwarning("提示", "请至少选择一个文件")
+        name = ctk.CTkInputDialog(text="任务名称 (同名覆盖):", title="保存任务").get_input()
+        if not name or not name.strip(): return
+        import jobs
+        jobs.put_job(jobs.job_from_config(name.strip(), self._build_cfg(), self.file_tree.selection))
+        self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | 已保存任务 {name.strip()}")
+
+    def build_all_jobs(self):
+        import jobs
+        saved = jobs.load_jobs()
+        if not saved: return messagebox.showwarning("提示", "还没有保存的任务")
+        self.build_all_btn.configure(state="disabled", text="⏳ 生成中...")
+        self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | 正在并行生成 {len(saved)} 个任务…")
+        self.engine.run(jobs.build_all, self._jobs_done, saved, self.content_cache, channel="jobs", priority=BULK,
+                        on_error=lambda msg: self._jobs_done(None))
+
+    def _jobs_done(self, summary):
+        self.build_all_btn.configure(state="normal", text="📦 全部生成")
+        if summary is None: return
+        import jobs
+        self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | "
+                                       f"已生成 {len(summary['jobs'])} 个任务 ({summary['seconds']:.2f} 秒)")
+        failed = any(res["error"] for res in summary["jobs"])
+        (messagebox.showwarning if failed else messagebox.showinfo)("批量生成", jobs.format_results(summary))
+
+    def _toggle_watch(self):
+        if not self.watch_var.get(): return self._stop_watch()
+        if not self.file_tree.selection:
+            self.watch_var.set(False)
+            return messagebox.showwarning("提示", "请至少选择一个文件")
+        self._start_watch()
+
+    def _start_watch(self):
+        from watcher import WatchSession, watch_roots
+        from content_cache import MemoryCache
+        ignores, gitignore = self._selection_config()
+        out = self.output_dir / self.name_entry.get()
+        key = (watch_roots(self.file_tree.selection.include_roots()), ignores, gitignore, out)
+        if self._watch is not None and self._watch_key == key:
+            self._watch_state['dirty'] = True
+            return self.engine.post(self._watch_regen, key="watch")
+        self._stop_watch()
+        self._watch_key = key
+        self._watch_state = {'dirty': True, 'pending': False, 'src': None, 'known': None,
+                             'cache': MemoryCache(self.content_cache)}
+        self._watch = WatchSession(key[0], ignores, gitignore, self._on_watch_events,
+                                   exclude=packager.own_outputs(out)).start()
+        self._watch_state['session'] = self._watch
+        self.engine.post(self._watch_regen, key="watch")
+
+    def _stop_watch(self):
+        if self._watch is None: return
+        self._watch.stop()
+        self._watch = None
+        self.engine.cancel("watch")
+
+    def _on_watch_events(self, events):
+        if any(structural for _, structural in events): self._watch_state['dirty'] = True
+        for path, _ in events:
+            if path is None: self.dir_cache.invalidate()
+            else: self.dir_cache.invalidate(Path(path).parent)
+        self.engine.post(self._revalidate, key="listing")
+        self.engine.post(self._watch_regen, key="watch")
+        self.engine.post(self._stats_changed, key="stats")
+
+    def _stats_changed(self):
+        self.sel_stats.reset(self.sel_stats.config)
+        self._summary_inflight.clear()
+        self._update_counters()
+
+    def _watch_regen(self):
+        if self._watch is None: return
+        state = self._watch_state
+        if self._watch_busy or self._gen_task is not None:
+            state['pending'] = True
+            return
+        cfg = self._build_cfg()
+        cfg.update(atomic=True, delta=None, known=state['known'], cache=state['cache'],
+                   src=None if state['dirty'] else state['src'])
+        state['dirty'] = state['pending'] = False
+        self._watch_busy = True
+        self.engine.run(self._watch_worker, self._watch_done, cfg, state, channel="watch", priority=BULK,
+                        with_task=True, on_cancel=self._watch_idle, on_error=lambda msg: self._watch_idle())
+
+    def _watch_worker(self, task, cfg, state):
+        state['session'].ready.wait()
+        if cfg['src'] is None:
+            cfg['src'] = packager.resolve_selection(cfg['selection'], cfg['ign'], cfg['gitignore'])
+        task.check()
+        if not cfg['src']: return state, None
+        cfg['progress'] = task.progress
+        packager.build_package(cfg)
+        return state, cfg
+
+    def _watch_idle(self):
+        self._watch_busy = False
+        if self._watch is not None and self._watch_state.get('pending'): self.engine.post(self._watch_regen, key="watch")
+
+    def _watch_done(self, result):
+        state, cfg = result
+        self._watch_idle()
+        if state is not self._watch_state or cfg is None: return
+        state['src'], state['known'] = cfg['src'], cfg['manifest_rows']
+        self.status_lbl.configure(text=f"工作区: {self.workspace_root.name} | "
+                                       f"{datetime.datetime.now():%H:%M:%S} 已自动更新 {Path(cfg['out']).name}")
 
 if __name__ == "__main__":
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support()
     app = ModernApp()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
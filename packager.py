@@ -0,0 +1,730 @@
+import os
+import re
+import json
+import mmap
+import hashlib
+import time
+import threading
+import glob
+import fnmatch
+import datetime
+from collections import deque
+from concurrent.futures import wait
+from pathlib import Path
+
+from ignore_rules import IgnoreRules, IgnoreMatcher, compile_ignores
+from walker import parallel_walk, iter_files
+from scheduler import get_scheduler, BULK
+import transforms
+import tokens
+from instrument import NULL_TRACE
+
+DEFAULT_IGNORES = (
+    "node_modules;.git;.svn;.hg;.idea;.vscode;.DS_Store;dist;build;coverage;venv;.env;"
+    "__pycache__;*.pyc;*.pyo;*.pyd;*.class;"
+    "*.exe;*.dll;*.so;*.dylib;*.bin;*.msi;*.apk;*.ipa;*.iso;*.img;*.dmg;"
+    "*.zip;*.tar;*.gz;*.rar;*.7z;*.jar;*.war;*.ear;*.bz2;*.xz;"
+    "*.png;*.jpg;*.jpeg;*.gif;*.bmp;*.ico;*.svg;*.tiff;*.webp;*.psd;*.ai;*.eps;*.icns;"
+    "*.mp3;*.mp4;*.wav;*.avi;*.mov;*.flv;*.wmv;*.mkv;*.m4a;*.flac;"
+    "*.pdf;*.doc;*.docx;*.xls;*.xlsx;*.ppt;*.pptx;*.odt;*.ods;"
+    "*.ttf;*.otf;*.woff;*.woff2;*.eot;"
+    "*.blend;*.fbx;*.obj;*.stl;*.max;*.ma;*.mb"
+)
+
+
+def format_size(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB": break
+        n /= 1024
+    return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+
+
+def parse_ignores(text):
+    if not isinstance(text, str): text = ";".join(text)
+    return [x.strip() for x in text.replace("\n", ";").split(";") if x.strip()]
+
+
+def is_ignored(p, ignores):
+    matcher = ignores if isinstance(ignores, IgnoreMatcher) else compile_ignores(ignores)
+    return matcher(os.path.basename(str(p)))
+
+
+def scan_dir(path, limit=None):
+    data = []
+    try:
+        with os.scandir(path) as it:
+            for e in it:
+                if limit is not None and len(data) >= limit: break
+                if e.name.startswith('.'): continue
+                try: is_dir = e.is_dir()
+                except OSError: is_dir = False
+                try: st = e.stat()
+                except OSError: st = None
+                sz = ""
+                if not is_dir:
+                    sz = f"{st.st_size/1024:.1f} KB" if st else "N/A"
+                mtime = ""
+                if st:
+                    try: mtime = datetime.datetime.fromtimestamp(st.st_mtime).strftime('%Y-%m-%d')
+                    except (OSError, OverflowError, ValueError): pass
+                data.append({
+                    "name": e.name, "path": str(e.path), "is_dir": is_dir,
+                    "size_str": sz, "date": mtime,
+                    "size": st.st_size if st and not is_dir else 0,
+                    "mtime": st.st_mtime if st else 0
+                })
+    except: pass
+    return data
+
+
+def walk_tree(root, ignores, gitignore=True, files_only=False, skip=None):
+    try:
+        rules = IgnoreRules.for_dir(str(root), ignores, gitignore)
+        return parallel_walk(root, rules, files_only=files_only, skip=skip)
+    except Exception: return set() if files_only else {str(root)}
+
+
+def walk_sizes(root, ignores, gitignore=True, skip=None, on_batch=None):
+    try:
+        rules = IgnoreRules.for_dir(str(root), ignores, gitignore)
+        return parallel_walk(root, rules, on_batch, skip=skip, sizes=True)
+    except Exception: return {}
+
+
+def walk_summary(root, ignores, gitignore=True, on_batch=None):
+    root = os.path.normcase(os.path.abspath(str(root)))
+    summary = {root: [0, 0]}
+
+    def add(items):
+        for p, size in items:
+            d = os.path.dirname(os.path.normcase(p))
+            while True:
+                agg = summary.setdefault(d, [0, 0])
+                agg[0] += 1
+                agg[1] += size
+                if d == root or len(d) <= len(root): break
+                d = os.path.dirname(d)
+
+    def batch(items):
+        add(items)
+        on_batch({d: tuple(v) for d, v in summary.items()})
+
+    if on_batch is None: add(walk_sizes(root, ignores, gitignore).items())
+    else: walk_sizes(root, ignores, gitignore, on_batch=batch)
+    return {d: tuple(v) for d, v in summary.items()}
+
+
+def resolve_selection(selection, ignores, gitignore=True, sizes=False):
+    skip = {os.path.normcase(p) for p in selection.exclude_roots()}
+    files = {}
+    for root in selection.include_roots():
+        if os.path.isdir(root):
+            files.update(walk_sizes(root, ignores, gitignore, skip))
+        elif os.path.isfile(root):
+            try: files[root] = os.stat(root).st_size
+            except OSError: pass
+    if sizes: return sorted(files.items())
+    return sorted(files)
+
+
+def iter_selection(selection, ignores, gitignore=True, check=None):
+    skip = {os.path.normcase(p) for p in selection.exclude_roots()}
+    for root in sorted(selection.include_roots()):
+        if check: check()
+        if os.path.isdir(root):
+            try: rules = IgnoreRules.for_dir(str(root), ignores, gitignore)
+            except Exception: continue
+            yield from iter_files(root, rules, skip, check)
+        elif os.path.isfile(root):
+            yield root
+
+
+def collect_files(root, ignores, includes=None, gitignore=True):
+    root = str(root)
+    files = []
+    for p in walk_tree(root, ignores, gitignore, files_only=True):
+        if includes:
+            rel = os.path.relpath(p, root).replace("\\", "/")
+            if not any(fnmatch.fnmatch(rel, g) or fnmatch.fnmatch(os.path.basename(p), g) for g in includes):
+                continue
+        files.append(p)
+    return sorted(files)
+
+
+def _display_root(cfg):
+    calc_root = cfg['root']
+    if cfg['rel_path'] and cfg['src']:
+        try:
+            common = os.path.commonpath(cfg['src'])
+            if common:
+                common_p = Path(common)
+                if not str(common_p).startswith(str(cfg['root'])):
+                    calc_root = common_p
+        except: pass
+    return calc_root
+
+
+def _display_path(f_path_str, cfg, calc_root, prefix=None):
+    if not cfg['rel_path']: return os.path.basename(f_path_str)
+    if prefix and f_path_str.startswith(prefix):
+        rest = f_path_str[len(prefix):]
+        if rest and os.path.normpath(rest) == rest: return rest.replace("\\", "/")
+    display_path = os.path.basename(f_path_str)
+    try:
+        display_path = os.path.relpath(f_path_str, cfg['root']).replace("\\", "/")
+        if display_path.startswith("..") and display_path.count("..") > 2:
+            display_path = os.path.relpath(f_path_str, calc_root).replace("\\", "/")
+    except: pass
+    return display_path
+
+
+SNIFF_BYTES = 8192
+PROBE_BATCH = 256
+DEFAULT_MAX_FILE = 4 * 1024 * 1024
+_TEXT_CONTROL = set(b"\t\n\r\f\b\x1b")
+
+
+def is_binary(sample):
+    if not sample: return False
+    if b"\0" in sample: return True
+    control = sum(1 for c in sample if c < 32 and c not in _TEXT_CONTROL)
+    return control / len(sample) > 0.3
+
+
+def _probe(paths, known=None):
+    res = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            row = known.get(p) if known else None
+            if row is not None and row[1] == st.st_size and row[2] == st.st_mtime_ns:
+                res.append((st, False))
+                continue
+            with open(p, "rb") as fh: head = fh.read(SNIFF_BYTES)
+            res.append((st, is_binary(head)))
+        except OSError:
+            res.append(None)
+    return res
+
+
+def probe_files(paths, known=None):
+    sched = get_scheduler()
+    jobs = [(paths[i:i + PROBE_BATCH], sched.submit(_probe, paths[i:i + PROBE_BATCH], known, priority=BULK))
+            for i in range(0, len(paths), PROBE_BATCH)]
+    return {p: probed for batch, job in jobs for p, probed in zip(batch, sched.result(job))}
+
+
+def own_outputs(out):
+    out = Path(out).absolute()
+    stem = os.path.join(str(out.parent), out.stem)
+    rx = re.compile(re.escape(stem) + r"(\.part\d+)?(" + re.escape(out.suffix) +
+                    r"|\.manifest\.json|\.index\.json)(\.tmp)?$", re.I if os.name == "nt" else 0)
+    return lambda p: rx.match(p) is not None
+
+
+def plan_entries(cfg, ignores, calc_root, known=None):
+    report = cfg.setdefault('report', {})
+    for k in ("binary", "over_limit", "truncated"): report.setdefault(k, 0)
+    max_file = cfg.get('max_file', DEFAULT_MAX_FILE)
+    max_total = cfg.get('max_total')
+    own = own_outputs(cfg['out']) if cfg.get('out') else lambda p: False
+    matcher = compile_ignores(ignores)
+    paths = [p for p in map(str, cfg['src']) if not is_ignored(p, matcher) and not own(p)]
+    prefix = os.path.join(os.path.abspath(str(cfg['root'])), "")
+    shared = cfg.get('probed') or {}
+    fresh = probe_files([p for p in paths if p not in shared], known)
+    entries, total = [], 0
+    for f_path_str in paths:
+        probed = fresh[f_path_str] if f_path_str in fresh else shared[f_path_str]
+        if probed is None: continue
+        st, binary = probed
+        if binary:
+            report['binary'] += 1
+            continue
+        size = min(st.st_size, max_file) if max_file else st.st_size
+        if max_total and total + size > max_total:
+            report['over_limit'] += 1
+            continue
+        total += size
+        if size < st.st_size: report['truncated'] += 1
+        suffix = os.path.splitext(f_path_str)[1]
+        entries.append({
+            "src": f_path_str,
+            "path": _display_path(f_path_str, cfg, calc_root, prefix),
+            "ext": suffix[1:] if suffix else "txt",
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns
+        })
+    return entries
+
+
+def decode_text(data):
+    return data.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _read_truncated(src, size, max_file):
+    head_n, tail_n = max_file * 3 // 4, max_file // 4
+    with open(src, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        head = mm[:head_n]
+        tail = mm[max(head_n, size - tail_n):size]
+    head = head[:head.rfind(b"\n") + 1] or head
+    nl = tail.find(b"\n")
+    if nl != -1: tail = tail[nl + 1:]
+    skipped = size - len(head) - len(tail)
+    return f"{decode_text(head)}\n…[truncated {format_size(skipped)}]…\n{decode_text(tail)}"
+
+
+def read_raw(entry, max_file=DEFAULT_MAX_FILE):
+    try:
+        if max_file and entry['size'] > max_file:
+            return _read_truncated(entry['src'], entry['size'], max_file)
+        return Path(entry['src']).read_text(encoding='utf-8', errors='ignore')
+    except: return None
+
+
+def cache_key_fn(cfg):
+    base_key = transforms.pipeline_key(transforms.pipeline_for(cfg), cfg.get('transform_opts') or {})
+    max_file = cfg.get('max_file', DEFAULT_MAX_FILE)
+    return lambda e: base_key + f"|max={max_file}" if max_file and e['size'] > max_file else base_key
+
+
+def read_batch(batch, cfg, processes=False):
+    names = transforms.pipeline_for(cfg)
+    opts = cfg.get('transform_opts') or {}
+    max_file = cfg.get('max_file', DEFAULT_MAX_FILE)
+    key_for = cache_key_fn(cfg)
+    cache = cfg.get('cache')
+    trace = cfg.get('trace') or NULL_TRACE
+    out = [None] * len(batch)
+    todo = []
+    for i, entry in enumerate(batch):
+        t = time.perf_counter()
+        if cache is not None:
+            content = cache.get(entry['src'], entry['size'], entry['mtime_ns'], key_for(entry))
+            if content is not None:
+                out[i] = content
+                trace.add("cache", t, span=False)
+                continue
+        raw = read_raw(entry, max_file)
+        trace.add("read", t, span=False)
+        trace.file(entry['path'], entry['size'], t)
+        if raw is not None: todo.append((i, raw))
+    if todo and names:
+        t = time.perf_counter()
+        items = [(raw, batch[i]['ext']) for i, raw in todo]
+        if processes:
+            done = transforms.get_process_pool().submit(transforms.apply_batch, items, names, opts).result()
+        else:
+            done = transforms.apply_batch(items, names, opts)
+        trace.add("transform", t)
+        todo = [(i, content) for (i, _), content in zip(todo, done)]
+    for i, content in todo:
+        out[i] = content
+        if cache is not None:
+            entry = batch[i]
+            cache.put(entry['src'], entry['size'], entry['mtime_ns'], content, key_for(entry))
+    return out
+
+
+def count_batch(batch, cfg, contents=None):
+    name, count = tokens.counter(cfg.get('exact_tokens'))
+    cache = cfg.get('cache')
+    key_for = cache_key_fn(cfg)
+    out = [None] * len(batch)
+    todo = []
+    for i, entry in enumerate(batch):
+        n = cache.get_tokens(entry['src'], entry['size'], entry['mtime_ns'], f"{key_for(entry)}|{name}") \
+            if cache is not None else None
+        if n is None: todo.append(i)
+        else: out[i] = n
+    if todo and contents is None:
+        read = read_batch([batch[i] for i in todo], cfg)
+        contents = dict(zip(todo, read))
+    for i in todo:
+        if contents[i] is None: continue
+        out[i] = count(contents[i])
+        if cache is not None:
+            entry = batch[i]
+            cache.put_tokens(entry['src'], entry['size'], entry['mtime_ns'], out[i], f"{key_for(entry)}|{name}")
+    return out
+
+
+BUDGET_OVERHEAD = 32
+
+
+def _priority_rank(patterns):
+    patterns = list(patterns or [])
+
+    def rank(e):
+        name = os.path.basename(e['path'])
+        hit = next((i for i, p in enumerate(patterns) if fnmatch.fnmatch(e['path'], p) or fnmatch.fnmatch(name, p)),
+                   len(patterns))
+        return hit, e['path'].count("/") + e['path'].count("\\"), e['tokens']
+    return rank
+
+
+def _count_entries(entries, cfg):
+    sched = get_scheduler()
+    jobs = [(unit, sched.submit(count_batch, unit, cfg, priority=BULK)) for unit in transforms.batches(entries)]
+    for unit, job in jobs:
+        for e, n in zip(unit, sched.result(job)): e['tokens'] = n or 0
+
+
+def fit_budget(entries, cfg):
+    budget = cfg['max_tokens']
+    report = cfg.setdefault('report', {})
+    for k in ("dropped", "token_truncated"): report.setdefault(k, 0)
+    _count_entries(entries, cfg)
+    used, keep = BUDGET_OVERHEAD, set()
+    for e in sorted(entries, key=_priority_rank(cfg.get('priority'))):
+        overhead = 2 * tokens.estimate(e['path']) + 20
+        if used + overhead + e['tokens'] <= budget:
+            used += overhead + e['tokens']
+        elif budget - used - overhead >= tokens.MIN_TRUNCATE_TOKENS:
+            e['max_tokens'] = budget - used - overhead
+            used = budget
+            report['token_truncated'] += 1
+        else:
+            report['dropped'] += 1
+            continue
+        keep.add(id(e))
+    return [e for e in entries if id(e) in keep]
+
+
+DEDUP_MIN_BYTES = 128
+
+
+def _read_unit(batch, cfg, processes):
+    contents = read_batch(batch, cfg, processes)
+    _, count = tokens.counter(cfg.get('exact_tokens'))
+    counts = count_batch(batch, cfg, contents)
+    out = []
+    for entry, content, n in zip(batch, contents, counts):
+        if content is None:
+            out.append((None, None, 0, 0))
+            continue
+        data = content.encode('utf-8')
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        if entry.get('max_tokens'):
+            content = tokens.truncate(content, entry['max_tokens'], count)
+            n = count(content)
+        out.append((content, digest, len(data), n))
+    return out
+
+
+def _hash_unit(batch, cfg):
+    return [None if c is None else hashlib.blake2b(c.encode('utf-8'), digest_size=16).hexdigest()
+            for c in read_batch(batch, cfg)]
+
+
+def manifest_path(out):
+    out = Path(out)
+    return out.with_name(f"{out.stem}.manifest.json")
+
+
+def load_manifest(path):
+    try:
+        with open(path, encoding="utf-8") as fh: return json.load(fh).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, rows):
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"version": 1, "files": rows}, fh, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def delta_entries(entries, cfg, prev):
+    report = cfg.setdefault('report', {})
+    rows = cfg['manifest_rows']
+    current = {e['src'] for e in entries}
+    cfg['deleted'] = sorted(row[0] for src, row in prev.items() if src not in current)
+    changed, stale = [], []
+    for e in entries:
+        old = prev.get(e['src'])
+        if old is None:
+            e['status'] = "added"
+            changed.append(e)
+        elif old[1] == e['size'] and old[2] == e['mtime_ns']:
+            rows[e['src']] = [e['path']] + old[1:]
+        else:
+            e['status'] = "modified"
+            stale.append(e)
+    sched = get_scheduler()
+    jobs = [(unit, sched.submit(_hash_unit, unit, cfg, priority=BULK)) for unit in transforms.batches(stale)]
+    same = set()
+    for unit, job in jobs:
+        for e, digest in zip(unit, sched.result(job)):
+            if digest is not None and digest == prev[e['src']][3]:
+                rows[e['src']] = [e['path'], e['size'], e['mtime_ns'], digest]
+                same.add(id(e))
+    changed += [e for e in stale if id(e) not in same]
+    report['added'] = sum(1 for e in changed if e['status'] == "added")
+    report['modified'] = len(changed) - report['added']
+    report['deleted'] = len(cfg['deleted'])
+    order = {id(e): i for i, e in enumerate(entries)}
+    return sorted(changed, key=lambda e: order[id(e)])
+
+
+class PackageWriter:
+    def __init__(self, fh):
+        self.fh = fh
+        self.tokens = 0
+        self._first = True
+
+    def _emit(self, s, ntokens=None):
+        if not self._first: self.fh.write("\n")
+        self._first = False
+        self.fh.write(s)
+        self.tokens += tokens.estimate(s) if ntokens is None else ntokens
+
+
+class MarkdownWriter(PackageWriter):
+    def header(self, entries):
+        self._emit("# Project Source Code Context")
+        self._emit("\n## File Tree")
+        for f in entries:
+            self._emit(f"- {f['path']}" + (f" ({f['status']})" if f.get('status') else ""))
+        self._emit("\n" + "="*40 + "\n")
+
+    def block(self, f, content, ntokens=None):
+        self._emit(f"## File: {f['path']}")
+        self._emit(f"```{f['ext']}")
+        self._emit(content, ntokens)
+        self._emit("```\n")
+
+    def reference(self, f, same_as):
+        self._emit(f"## File: {f['path']}")
+        self._emit(f"_Identical to `{same_as}`._\n")
+
+    def footer(self, deleted=()):
+        if not deleted: return
+        self._emit("## Deleted Files")
+        for p in deleted:
+            self._emit(f"- {p}")
+
+
+class XmlWriter(PackageWriter):
+    def header(self, entries):
+        self._emit("<project_context>")
+        self._emit("  <file_tree>")
+        for f in entries:
+            status = f' status="{f["status"]}"' if f.get('status') else ""
+            self._emit(f'    <file path="{f["path"]}"{status} />')
+        self._emit("  </file_tree>")
+        self._emit("  <source_code>")
+
+    def block(self, f, content, ntokens=None):
+        safe_content = content.replace("]]>", "]]]]><![CDATA[>")
+        self._emit(f'    <file path="{f["path"]}">')
+        self._emit(f'<![CDATA[\n{safe_content}\n]]>', ntokens)
+        self._emit('    </file>')
+
+    def reference(self, f, same_as):
+        self._emit(f'    <file path="{f["path"]}" same_as="{same_as}" />')
+
+    def footer(self, deleted=()):
+        self._emit("  </source_code>")
+        if deleted:
+            self._emit("  <deleted_files>")
+            for p in deleted:
+                self._emit(f'    <file path="{p}" />')
+            self._emit("  </deleted_files>")
+        self._emit("</project_context>")
+
+
+WRITERS = {"markdown": MarkdownWriter, "xml": XmlWriter}
+DEFAULT_MAX_INFLIGHT = 64 * 1024 * 1024
+WRITE_BUFFER = 1024 * 1024
+SHARD_DIGITS = 3
+
+
+def stream_package(entries, cfg, writer):
+    max_inflight = cfg.get('max_inflight') or DEFAULT_MAX_INFLIGHT
+    progress = cfg.get('progress')
+    trace = cfg.get('trace') or NULL_TRACE
+    sched = get_scheduler()
+    window = sched.workers * 4
+    total, total_bytes = len(entries), sum(f['size'] for f in entries)
+    processes = transforms.use_processes(transforms.pipeline_for(cfg), total_bytes)
+    dedup = cfg.get('dedup', False)
+    rows = cfg.get('manifest_rows')
+    report = cfg.setdefault('report', {})
+    report.setdefault('dup_files', 0)
+    report.setdefault('dup_bytes', 0)
+    seen = {}
+    units = transforms.batches(entries) if processes else ([f] for f in entries)
+    done, done_bytes = 0, 0
+    stream_start = time.perf_counter()
+    writer.header(entries)
+    pending = deque()
+    inflight = 0
+    nxt = next(units, None)
+    try:
+        while nxt is not None or pending:
+            while nxt is not None and (not pending or (inflight < max_inflight and len(pending) < window)):
+                pending.append((nxt, sched.submit(_read_unit, nxt, cfg, processes, priority=BULK)))
+                inflight += sum(f['size'] for f in nxt)
+                nxt = next(units, None)
+            trace.sample_queue(sched.queue_depth())
+            batch, fut = pending.popleft()
+            inflight -= sum(f['size'] for f in batch)
+            for f, (content, digest, nbytes, ntokens) in zip(batch, sched.result(fut)):
+                if rows is not None and digest is not None:
+                    rows[f['src']] = [f['path'], f['size'], f['mtime_ns'], digest]
+                key = digest if dedup and nbytes >= DEDUP_MIN_BYTES and not f.get('max_tokens') else None
+                t = time.perf_counter()
+                if key is not None and key in seen:
+                    writer.reference(f, seen[key])
+                    report['dup_files'] += 1
+                    report['dup_bytes'] += nbytes
+                elif content is not None:
+                    if key is not None: seen[key] = f['path']
+                    writer.block(f, content, ntokens)
+                trace.add("format", t, span=False)
+                trace.count(1, f['size'])
+                done, done_bytes = done + 1, done_bytes + f['size']
+                if progress: progress(done, total, done_bytes, total_bytes)
+    finally:
+        for _, fut in pending: fut.cancel()
+        trace.add("stream", stream_start)
+    writer.footer(cfg.get('deleted', ()))
+    report['tokens'] = writer.tokens
+
+
+def _write(out, entries, cfg):
+    target = out.with_name(out.name + ".tmp") if cfg.get('atomic') else out
+    try:
+        with open(target, "w", encoding="utf-8", buffering=WRITE_BUFFER) as fh:
+            stream_package(entries, cfg, WRITERS.get(cfg['fmt'], MarkdownWriter)(fh))
+        if target is not out: os.replace(target, out)
+    except BaseException:
+        if target is not out:
+            try: target.unlink()
+            except OSError: pass
+        raise
+
+
+def split_shards(entries, cfg):
+    max_bytes, max_tokens = cfg.get('shard_bytes'), cfg.get('shard_tokens')
+    max_file = cfg.get('max_file', DEFAULT_MAX_FILE)
+    if max_tokens and any('tokens' not in e for e in entries): _count_entries(entries, cfg)
+    shards, cur, used = [], [], 0
+    for e in entries:
+        if max_tokens:
+            cost, limit = e['tokens'] + 2 * tokens.estimate(e['path']) + 20, max_tokens
+        else:
+            cost, limit = (min(e['size'], max_file) if max_file else e['size']) + 2 * len(e['path']) + 40, max_bytes
+        if cur and used + cost > limit:
+            shards.append(cur)
+            cur, used = [], 0
+        cur.append(e)
+        used += cost
+    if cur: shards.append(cur)
+    return shards
+
+
+def _shard_progress(cfg, total, total_bytes):
+    progress = cfg.get('progress')
+    if progress is None: return lambda: None
+    lock, state = threading.Lock(), [0, 0]
+
+    def tracker():
+        last = [0, 0]
+
+        def cb(done, _total, done_bytes, _total_bytes):
+            with lock:
+                state[0] += done - last[0]
+                state[1] += done_bytes - last[1]
+                last[:] = done, done_bytes
+                d, b = state
+            progress(d, total, b, total_bytes)
+        return cb
+    return tracker
+
+
+def write_shards(out, entries, cfg, written):
+    shards = split_shards(entries, cfg)
+    paths = [out.with_name(f"{out.stem}.part{i:0{SHARD_DIGITS}d}{out.suffix}") for i in range(1, len(shards) + 1)]
+    if not cfg.get('atomic'): written.extend(paths)
+    tracker = _shard_progress(cfg, len(entries), sum(e['size'] for e in entries))
+    cfgs = [dict(cfg, report={}, progress=tracker()) for _ in shards]
+    sched = get_scheduler()
+    jobs = [sched.submit(_write, p, s, c, priority=BULK) for p, s, c in zip(paths, shards, cfgs)]
+    try:
+        for job in jobs: sched.result(job)
+    except BaseException:
+        for job in jobs: job.cancel()
+        wait([job for job in jobs if not job.cancelled()])
+        raise
+
+    report = cfg['report']
+    for c in cfgs:
+        for k, v in c['report'].items(): report[k] = report.get(k, 0) + v
+    report['shards'] = len(shards)
+    index = out.with_name(f"{out.stem}.index.json")
+    if not cfg.get('atomic'): written.append(index)
+    with open(index, "w", encoding="utf-8") as fh:
+        json.dump({"shards": [{"file": p.name, "tokens": c['report']['tokens'], "paths": [e['path'] for e in s]}
+                              for p, s, c in zip(paths, shards, cfgs)]}, fh, ensure_ascii=False, indent=2)
+    _remove_stale_outputs(out, paths + [index])
+    return index
+
+
+def _remove_stale_outputs(out, keep):
+    rx = re.compile(re.escape(out.stem) + r"((\.part\d+)?" + re.escape(out.suffix) + r"|\.index\.json)$")
+    keep = {p.name for p in keep}
+    for p in out.parent.glob(glob.escape(out.stem) + ".*"):
+        if p.name not in keep and rx.match(p.name):
+            try: p.unlink()
+            except OSError: pass
+
+
+def prepare_entries(cfg):
+    cfg['report'] = {}
+    cfg['deleted'] = ()
+    cfg['manifest_rows'] = {}
+    trace = cfg.get('trace') or NULL_TRACE
+    ignores = parse_ignores(cfg['ign'])
+    prev = load_manifest(cfg['delta']) if cfg.get('delta') else None
+    known = cfg.get('known') if prev is None else prev
+    if known is None and cfg.get('manifest'): known = load_manifest(cfg['manifest'])
+    with trace.stage("plan"):
+        entries = plan_entries(cfg, ignores, _display_root(cfg), known)
+    if prev is not None:
+        with trace.stage("delta"): entries = delta_entries(entries, cfg, prev)
+    if cfg.get('max_tokens'):
+        with trace.stage("budget"): entries = fit_budget(entries, cfg)
+    return entries
+
+
+def build_package(cfg, entries=None):
+    trace = cfg.get('trace') or NULL_TRACE
+    with trace.stage("total"):
+        return _build_package(cfg, trace, entries)
+
+
+def _build_package(cfg, trace, entries=None):
+    if entries is None: entries = prepare_entries(cfg)
+    out = Path(cfg['out'])
+    written = []
+    try:
+        if cfg.get('shard_bytes') or cfg.get('shard_tokens'):
+            out = write_shards(out, entries, cfg, written)
+        else:
+            if not cfg.get('atomic'): written.append(out)
+            _write(out, entries, cfg)
+            _remove_stale_outputs(out, [out])
+        if cfg.get('manifest'):
+            with trace.stage("manifest"): save_manifest(cfg['manifest'], cfg['manifest_rows'])
+    except BaseException:
+        for p in written:
+            try: p.unlink()
+            except OSError: pass
+        raise
+    finally:
+        if cfg.get('cache') is not None: cfg['cache'].flush()
+    return str(out)
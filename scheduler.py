@@ -0,0 +1,112 @@
+import os
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+INTERACTIVE, BACKGROUND, BULK = 0, 1, 2
+
+
+def default_workers():
+    env = os.environ.get("PROMPT_PACKAGER_WORKERS")
+    if env and env.isdigit() and int(env) > 0: return int(env)
+    return min(32, (os.cpu_count() or 4) + 4)
+
+
+class Job(Future):
+    def __init__(self, fn, args, kwargs, priority):
+        super().__init__()
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.priority = priority
+        self.claimed = False
+
+
+class Scheduler:
+    def __init__(self, workers=None):
+        self.workers = workers or default_workers()
+        self.bulk_limit = max(1, self.workers - 2)
+        self._heap = []
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+        self._threads = 0
+        self._idle = 0
+        self._running_bulk = 0
+
+    def submit(self, fn, *args, priority=BULK, **kwargs):
+        job = Job(fn, args, kwargs, priority)
+        with self._cv:
+            heapq.heappush(self._heap, (priority, next(self._seq), job))
+            if self._idle == 0 and self._threads < self.workers:
+                self._threads += 1
+                threading.Thread(target=self._worker, name=f"scheduler-{self._threads}", daemon=True).start()
+            self._cv.notify()
+        return job
+
+    def queue_depth(self):
+        with self._cv:
+            return sum(1 for _, _, job in self._heap if not job.claimed)
+
+    def _claim(self, job):
+        with self._cv:
+            if job.claimed: return False
+            job.claimed = True
+            return True
+
+    def _execute(self, job):
+        if not job.set_running_or_notify_cancel(): return
+        try:
+            res = job.fn(*job.args, **job.kwargs)
+        except BaseException as e:
+            job.set_exception(e)
+        else:
+            job.set_result(res)
+
+    def _next_job(self):
+        while True:
+            while self._heap and self._heap[0][2].claimed:
+                heapq.heappop(self._heap)
+            if self._heap and not (self._heap[0][0] >= BULK and self._running_bulk >= self.bulk_limit):
+                job = heapq.heappop(self._heap)[2]
+                job.claimed = True
+                return job
+            self._idle += 1
+            self._cv.wait()
+            self._idle -= 1
+
+    def _worker(self):
+        while True:
+            with self._cv:
+                job = self._next_job()
+                bulk = job.priority >= BULK
+                if bulk: self._running_bulk += 1
+            try:
+                self._execute(job)
+            finally:
+                if bulk:
+                    with self._cv:
+                        self._running_bulk -= 1
+                        self._cv.notify()
+
+    def result(self, job):
+        if self._claim(job): self._execute(job)
+        return job.result()
+
+    def wait_any(self, jobs):
+        done = {j for j in jobs if j.done()}
+        if done: return done, set(jobs) - done
+        for job in jobs:
+            if self._claim(job):
+                self._execute(job)
+                return {job}, set(jobs) - {job}
+        return wait(jobs, return_when=FIRST_COMPLETED)
+
+
+_scheduler = None
+_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _lock:
+        if _scheduler is None: _scheduler = Scheduler()
+        return _scheduler
@@ -0,0 +1,143 @@
+import os
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+import packager
+from content_cache import default_cache_dir
+from scheduler import get_scheduler, BACKGROUND
+
+MAX_FILE = 1024 * 1024
+MIN_QUERY = 3
+STAT_BATCH = 512
+READ_BATCH = 128
+
+
+def _stamps(paths):
+    res = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            res.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            res.append(None)
+    return res
+
+
+def _texts(items):
+    res = []
+    for p, size in items:
+        if size > MAX_FILE:
+            res.append(None)
+            continue
+        try:
+            with open(p, "rb") as fh: data = fh.read(MAX_FILE)
+        except OSError:
+            data = None
+        res.append(None if data is None or packager.is_binary(data[:packager.SNIFF_BYTES]) else packager.decode_text(data))
+    return res
+
+
+def _prefix_range(root):
+    prefix = os.path.join(root, "")
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SearchIndex:
+    def __init__(self, path=None):
+        path = Path(path) if path else default_cache_dir() / "search.db"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS docs (path TEXT PRIMARY KEY, doc INTEGER, size INTEGER, "
+                         "mtime_ns INTEGER)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS docs_doc ON docs (doc)")
+        self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS grams USING fts5(body, content='', tokenize='trigram')")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        self.next_doc = meta.get("next_doc", 1)
+        self.garbage = meta.get("garbage", 0)
+
+    def update(self, root, ignores, gitignore=True, check=None):
+        t0 = time.perf_counter()
+        root = os.path.abspath(str(root))
+        files = sorted(packager.walk_tree(root, ignores, gitignore, files_only=True))
+        with self._lock:
+            known = {p: (doc, size, mtime_ns) for p, doc, size, mtime_ns in self._db.execute(
+                "SELECT path, doc, size, mtime_ns FROM docs WHERE path >= ? AND path < ?", _prefix_range(root))}
+        sched = get_scheduler()
+        jobs = [(files[i:i + STAT_BATCH], sched.submit(_stamps, files[i:i + STAT_BATCH], priority=BACKGROUND))
+                for i in range(0, len(files), STAT_BATCH)]
+        changed, seen = [], set()
+        for batch, job in jobs:
+            for p, stamp in zip(batch, sched.result(job)):
+                if stamp is None: continue
+                seen.add(p)
+                old = known.get(p)
+                if old is None or old[1:] != stamp: changed.append((p, stamp))
+        removed = [p for p in known if p not in seen]
+
+        jobs = [(changed[i:i + READ_BATCH], sched.submit(_texts, [(p, st[0]) for p, st in changed[i:i + READ_BATCH]],
+                                                          priority=BACKGROUND))
+                for i in range(0, len(changed), READ_BATCH)]
+        indexed = 0
+        for batch, job in jobs:
+            if check: check()
+            texts = sched.result(job)
+            with self._lock:
+                self._db.execute("BEGIN")
+                for (p, (size, mtime_ns)), text in zip(batch, texts):
+                    doc = 0
+                    if text is not None:
+                        doc, self.next_doc = self.next_doc, self.next_doc + 1
+                        self._db.execute("INSERT INTO grams (rowid, body) VALUES (?, ?)", (doc, text))
+                        indexed += 1
+                    if known.get(p, (0,))[0]: self.garbage += 1
+                    self._db.execute("INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?)", (p, doc, size, mtime_ns))
+                self._save_meta()
+                self._db.execute("COMMIT")
+        if removed:
+            with self._lock:
+                self._db.execute("BEGIN")
+                self.garbage += sum(1 for p in removed if known[p][0])
+                self._db.executemany("DELETE FROM docs WHERE path=?", [(p,) for p in removed])
+                self._save_meta()
+                self._db.execute("COMMIT")
+        if self._compact(): return self.update(root, ignores, gitignore, check)
+        return {"files": len(files), "indexed": indexed, "removed": len(removed),
+                "seconds": time.perf_counter() - t0}
+
+    def _save_meta(self):
+        self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                             [("next_doc", self.next_doc), ("garbage", self.garbage)])
+
+    def _compact(self):
+        with self._lock:
+            live = self._db.execute("SELECT COUNT(*) FROM docs WHERE doc > 0").fetchone()[0]
+            if self.garbage <= max(live, 1000): return False
+            self._db.execute("BEGIN")
+            self._db.execute("INSERT INTO grams (grams) VALUES ('delete-all')")
+            self._db.execute("UPDATE docs SET doc=0, size=-1")
+            self.next_doc, self.garbage = 1, 0
+            self._save_meta()
+            self._db.execute("COMMIT")
+            return True
+
+    def search(self, root, query):
+        query = query.strip()
+        if len(query) < MIN_QUERY: return []
+        phrase = '"' + query.replace('"', '""') + '"'
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT docs.path FROM grams JOIN docs ON docs.doc = grams.rowid "
+                "WHERE grams MATCH ? AND docs.path >= ? AND docs.path < ?",
+                (phrase,) + _prefix_range(os.path.abspath(str(root)))).fetchall()
+        return sorted(p for p, in rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
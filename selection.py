@@ -0,0 +1,157 @@
+import os
+
+CHECKED, UNCHECKED, PARTIAL = "checked", "unchecked", "partial"
+
+
+class _Node:
+    __slots__ = ("children", "rule", "path")
+
+    def __init__(self, path=None):
+        self.children = {}
+        self.rule = None
+        self.path = path
+
+
+def _split(path):
+    path = os.path.abspath(str(path))
+    drive, rest = os.path.splitdrive(path)
+    parts = [p for p in os.path.normcase(rest).split(os.sep) if p]
+    return path, [os.path.normcase(drive) or os.sep] + parts
+
+
+def _prefixes(path):
+    head, prefixes = path, []
+    while True:
+        prefixes.append(head)
+        parent = os.path.dirname(head)
+        if parent == head: break
+        head = parent
+    return prefixes[::-1]
+
+
+class SelectionModel:
+    def __init__(self):
+        self.root = _Node()
+        self.version = 0
+
+    def _find(self, path):
+        _, parts = _split(path)
+        node, state, trail = self.root, False, []
+        for part in parts:
+            nxt = node.children.get(part)
+            if nxt is None: return None, state, trail
+            trail.append((node, part))
+            node = nxt
+            if node.rule is not None: state = node.rule
+        return node, state, trail
+
+    def set(self, path, included):
+        path, parts = _split(path)
+        node, inherited, trail = self.root, False, []
+        for part, prefix in zip(parts, _prefixes(path)):
+            if node.rule is not None: inherited = node.rule
+            trail.append((node, part))
+            node = node.children.setdefault(part, _Node(prefix))
+        node.children = {}
+        node.rule = None if inherited == included else included
+        for parent, part in reversed(trail):
+            child = parent.children[part]
+            if child.rule is not None or child.children: break
+            del parent.children[part]
+        self.version += 1
+
+    def is_selected(self, path):
+        return self._find(path)[1]
+
+    __contains__ = is_selected
+
+    def status(self, path):
+        node, state, _ = self._find(path)
+        if node is not None and node.children: return PARTIAL
+        return CHECKED if state else UNCHECKED
+
+    def clear(self):
+        self.root = _Node()
+        self.version += 1
+
+    def _rules(self, node=None, inherited=False):
+        node = node or self.root
+        for child in node.children.values():
+            state = inherited if child.rule is None else child.rule
+            if child.rule is not None: yield child.path, child.rule, inherited
+            yield from self._rules(child, state)
+
+    def include_roots(self):
+        return [p for p, rule, inherited in self._rules() if rule and not inherited]
+
+    def exclude_roots(self):
+        return [p for p, rule, inherited in self._rules() if not rule]
+
+    def __bool__(self):
+        return any(True for _ in self.include_roots())
+
+    def __len__(self):
+        return sum(1 for _ in self._rules())
+
+    def copy(self):
+        other = SelectionModel()
+        for p, rule, _ in self._rules():
+            node = other.root
+            for part, prefix in zip(_split(p)[1], _prefixes(p)): node = node.children.setdefault(part, _Node(prefix))
+            node.rule = rule
+        other.version = self.version
+        return other
+
+
+class SelectionStats:
+    def __init__(self, config=None):
+        self.config = config
+        self.dirs = {}
+        self.files = {}
+        self.partial = {}
+
+    def reset(self, config):
+        self.config = config
+        self.dirs = {}
+        self.files = {}
+        self.partial = {}
+
+    def add_partial(self, summary):
+        self.partial.update(summary)
+
+    def add_summary(self, summary, files=()):
+        self.dirs.update(summary)
+        for p, size in dict(files).items(): self.note_file(p, size)
+
+    def note_file(self, path, size):
+        self.files[os.path.normcase(os.path.abspath(str(path)))] = size
+
+    def _subtree(self, path, pending, ignored):
+        key = os.path.normcase(path)
+        if key in self.dirs: return self.dirs[key]
+        if key not in self.files:
+            pending.append(path)
+            return self.partial.get(key, (0, 0))
+        size = self.files[key]
+        if size is None or (ignored and ignored(os.path.basename(path))): return (0, 0)
+        return (1, size)
+
+    def totals(self, selection, ignored=None):
+        pending = []
+
+        def walk(node, inherited):
+            state = inherited if node.rule is None else node.rule
+            if state and node.path is not None:
+                count, size = self._subtree(node.path, pending, ignored)
+            else:
+                count, size = 0, 0
+            for child in node.children.values():
+                c_count, c_size = walk(child, state)
+                if state and child.path is not None:
+                    full = self._subtree(child.path, [], ignored)
+                    c_count, c_size = c_count - full[0], c_size - full[1]
+                count, size = count + c_count, size + c_size
+            return count, size
+
+        count, size = walk(selection.root, False)
+        return max(count, 0), max(size, 0), pending
@@ -0,0 +1,332 @@
+import sys
+import json
+import argparse
+import ipaddress
+import threading
+import multiprocessing
+from pathlib import Path
+from urllib.parse import urlsplit
+from collections import OrderedDict, deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import packager
+import transforms
+import cli
+import deps
+from content_cache import ContentCache, MemoryCache
+from watcher import WatchSession
+
+DEFAULT_PORT = 8765
+CHUNK_BYTES = 64 * 1024
+BUFFER_CHUNKS = 64
+MAX_WATCHED_ROOTS = 16
+FILE_OPTIONS = {"root", "output", "watch", "poll", "cache", "cache_dir", "clear_cache", "manifest", "delta",
+                "shard_size", "shard_tokens", "stats_json", "trace", "profile", "save_job", "build_all", "job",
+                "jobs_file"}
+LOOPBACK_HOSTS = {"localhost", "127.0.0.1", "::1"}
+CONTENT_TYPES = {"markdown": "text/markdown; charset=utf-8", "xml": "application/xml; charset=utf-8"}
+
+
+class Broadcast:
+    def __init__(self, limit=BUFFER_CHUNKS):
+        self.chunks = deque()
+        self.first = 0
+        self.limit = limit
+        self.cursors = {}
+        self.done = False
+        self.error = None
+        self.aborted = False
+        self._cv = threading.Condition()
+
+    def attach(self):
+        with self._cv:
+            if self.aborted or self.first: return None
+            token = object()
+            self.cursors[token] = 0
+            return self._read(token)
+
+    def push(self, data):
+        with self._cv:
+            while self.cursors and len(self.chunks) >= self.limit:
+                low = min(self.cursors.values())
+                while self.first < low:
+                    self.chunks.popleft()
+                    self.first += 1
+                if len(self.chunks) >= self.limit: self._cv.wait()
+            if not self.cursors:
+                self.aborted = True
+                raise BrokenPipeError("所有客户端均已断开")
+            self.chunks.append(data)
+            self._cv.notify_all()
+
+    def close(self, error=None):
+        with self._cv:
+            self.done, self.error = True, error
+            self._cv.notify_all()
+
+    def _read(self, token):
+        try:
+            while True:
+                with self._cv:
+                    i = self.cursors[token]
+                    while i >= self.first + len(self.chunks) and not self.done: self._cv.wait()
+                    if i >= self.first + len(self.chunks): break
+                    chunk = self.chunks[i - self.first]
+                    self.cursors[token] = i + 1
+                    self._cv.notify_all()
+                yield chunk
+            if self.error is not None: yield f"\n…[error: {self.error}]…\n".encode("utf-8")
+        finally:
+            with self._cv:
+                del self.cursors[token]
+                self._cv.notify_all()
+
+
+class ChunkSink:
+    def __init__(self, broadcast):
+        self.broadcast = broadcast
+        self._buf = []
+        self._size = 0
+
+    def write(self, s):
+        self._buf.append(s)
+        self._size += len(s)
+        if self._size >= CHUNK_BYTES: self.flush()
+
+    def flush(self):
+        if not self._buf: return
+        self.broadcast.push("".join(self._buf).encode("utf-8"))
+        self._buf, self._size = [], 0
+
+
+class FileLists:
+    def __init__(self, max_roots=MAX_WATCHED_ROOTS):
+        self.max_roots = max_roots
+        self._lists = {}
+        self._watches = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, root, ign, includes, gitignore):
+        wkey = (str(root), tuple(ign), gitignore)
+        key = wkey + (tuple(includes),)
+        with self._lock:
+            files = self._lists.get(key)
+            if files is not None:
+                self._watches.move_to_end(wkey)
+                return files
+        session, gen = self._watch(wkey)
+        session.ready.wait()
+        files = packager.collect_files(root, ign, includes, gitignore)
+        with self._lock:
+            entry = self._watches.get(wkey)
+            if entry is not None and entry[1] == gen: self._lists[key] = files
+        return files
+
+    def _watch(self, wkey):
+        with self._lock:
+            entry = self._watches.get(wkey)
+            if entry is not None: return tuple(entry)
+        session = WatchSession([wkey[0]], list(wkey[1]), wkey[2], lambda events: self._changed(wkey, events))
+        with self._lock:
+            self._watches[wkey] = [session, 0]
+            while len(self._watches) > self.max_roots:
+                old, (stale, _) = self._watches.popitem(last=False)
+                stale.stop()
+                self._drop(old)
+        session.start()
+        return session, 0
+
+    def _changed(self, wkey, events):
+        if not any(structural for _, structural in events): return
+        with self._lock:
+            entry = self._watches.get(wkey)
+            if entry is not None: entry[1] += 1
+            self._drop(wkey)
+
+    def _drop(self, wkey):
+        for key in [k for k in self._lists if k[:3] == wkey]: del self._lists[key]
+
+    def close(self):
+        with self._lock:
+            for session, _ in self._watches.values(): session.stop()
+            self._watches.clear()
+            self._lists.clear()
+
+
+def is_loopback(host):
+    if host.lower() == "localhost": return True
+    try: return ipaddress.ip_address(host).is_loopback
+    except ValueError: return False
+
+
+def _option_value(name, v, default):
+    if isinstance(default, list):
+        if isinstance(v, str): v = [v]
+        if isinstance(v, list) and all(isinstance(x, str) for x in v): return v
+        raise ValueError(f"参数 {name} 必须是字符串或字符串数组")
+    if isinstance(default, bool):
+        if isinstance(v, bool): return v
+        raise ValueError(f"参数 {name} 必须是 true / false")
+    if isinstance(default, (int, float)):
+        if isinstance(v, bool) or not isinstance(v, int if isinstance(default, int) else (int, float)):
+            raise ValueError(f"参数 {name} 必须是{'整数' if isinstance(default, int) else '数字'}")
+        return type(default)(v)
+    if isinstance(v, str): return v
+    raise ValueError(f"参数 {name} 必须是字符串")
+
+
+def request_args(body):
+    if not isinstance(body, dict): raise ValueError("请求体必须是 JSON 对象")
+    root = body.get("root")
+    if not isinstance(root, str) or not root: raise ValueError("缺少 root")
+    args = cli.build_parser().parse_args(["--", root])
+    for k, v in body.items():
+        if k in FILE_OPTIONS: continue
+        if not hasattr(args, k): raise ValueError(f"未知参数: {k}")
+        setattr(args, k, _option_value(k, v, getattr(args, k)))
+    if args.format not in CONTENT_TYPES: raise ValueError(f"未知格式: {args.format}")
+    unknown = [t for t in args.transform if t not in transforms.TRANSFORMS]
+    if unknown: raise ValueError(f"未知处理步骤: {', '.join(unknown)}")
+    return args
+
+
+class PackagerServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, cache):
+        super().__init__(address, Handler)
+        self.hosts = LOOPBACK_HOSTS | {address[0].lower()}
+        self.cache = cache
+        self.lists = FileLists()
+        self.inflight = {}
+        self.served = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def join(self, key, cfg):
+        with self._lock:
+            self.served += 1
+            bc = self.inflight.get(key)
+            reader = bc.attach() if bc is not None else None
+            if reader is not None:
+                self.coalesced += 1
+                return reader
+            bc = self.inflight[key] = Broadcast()
+            reader = bc.attach()
+        threading.Thread(target=self._produce, args=(key, bc, cfg), name="package", daemon=True).start()
+        return reader
+
+    def _produce(self, key, bc, cfg):
+        error = None
+        try:
+            entries = packager.prepare_entries(cfg)
+            sink = ChunkSink(bc)
+            packager.stream_package(entries, cfg, packager.WRITERS[cfg['fmt']](sink))
+            sink.flush()
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            error = str(e)
+        finally:
+            with self._lock:
+                if self.inflight.get(key) is bc: del self.inflight[key]
+            bc.close(error)
+            if self.cache is not None: self.cache.flush()
+
+    def stats(self):
+        return {"served": self.served, "coalesced": self.coalesced, "inflight": len(self.inflight),
+                "cache": self.cache.stats() if self.cache is not None else None}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _json(self, status, obj):
+        data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if status >= 400:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _forbidden(self):
+        host = urlsplit("//" + self.headers.get("Host", "")).hostname
+        if host not in self.server.hosts: return "Host 不被允许"
+        origin = self.headers.get("Origin")
+        if origin is not None and urlsplit(origin).hostname not in self.server.hosts: return "Origin 不被允许"
+
+    def do_GET(self):
+        if error := self._forbidden(): return self._json(403, {"error": error})
+        if self.path == "/health": return self._json(200, {"ok": True})
+        if self.path == "/stats": return self._json(200, self.server.stats())
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if error := self._forbidden(): return self._json(403, {"error": error})
+        if self.path != "/package": return self._json(404, {"error": "not found"})
+        if self.headers.get_content_type() != "application/json":
+            return self._json(415, {"error": "Content-Type 必须是 application/json"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            args = request_args(body)
+        except (ValueError, TypeError) as e:
+            return self._json(400, {"error": str(e)})
+        root = Path(args.root).resolve()
+        if not root.is_dir(): return self._json(400, {"error": f"目录不存在 {root}"})
+
+        ign = packager.parse_ignores(([] if args.no_default_ignores else [packager.DEFAULT_IGNORES]) + args.ignore)
+        files = self.server.lists.get(root, ign, args.include, args.gitignore)
+        if args.deps and args.include and files: files = deps.closure(files, root, ign, args.gitignore)
+        if not files: return self._json(404, {"error": "没有匹配的文件"})
+        cfg = cli.make_config(args, root, files, ign, self.server.cache, None)
+        cfg.update(shard_bytes=0, shard_tokens=0)
+        key = json.dumps(sorted(vars(args).items()), default=str)
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[args.format])
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in self.server.join(key, cfg):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m server", description="Prompt Packager 本地打包服务")
+    ap.add_argument("--host", default="127.0.0.1", help="监听地址 (默认: %(default)s)")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT, help="端口 (默认: %(default)s)")
+    ap.add_argument("--no-cache", dest="cache", action="store_false", help="不使用磁盘内容缓存")
+    ap.add_argument("--cache-dir", help="缓存目录 (默认: 用户缓存目录/PromptPackager)")
+    ap.add_argument("--allow-remote", action="store_true", help="允许监听非回环地址 (任何能访问该地址的人都能读取本机文件)")
+    args = ap.parse_args(argv)
+    if not is_loopback(args.host):
+        if not args.allow_remote:
+            print(f"错误: {args.host} 不是回环地址, 服务会把本机任意目录暴露给网络; 确需如此请加 --allow-remote",
+                  file=sys.stderr)
+            return 2
+        print(f"警告: 正在监听 {args.host}, 能访问该地址的任何人都可以读取本机文件", file=sys.stderr)
+
+    backing = ContentCache(Path(args.cache_dir) / "content.db" if args.cache_dir else None) if args.cache else None
+    server = PackagerServer((args.host, args.port), MemoryCache(backing))
+    print(f"监听 http://{args.host}:{server.server_address[1]}  (POST /package, GET /stats)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.lists.close()
+        server.cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import pytest
+
+from ignore_rules import GitIgnore, IgnoreRules
+
+
+def match(lines, rel, is_dir=False):
+    return GitIgnore(lines).match(rel, is_dir)
+
+
+def test_negation_reincludes_later():
+    lines = ["*.log", "!keep.log"]
+    assert match(lines, "a.log") is True
+    assert match(lines, "keep.log") is False
+    assert match(lines, "sub/keep.log") is False
+    assert match(lines, "a.txt") is None
+
+
+def test_last_matching_rule_wins():
+    assert match(["!keep.log", "*.log"], "keep.log") is True
+
+
+@pytest.mark.parametrize("rel, expected", [("build", True), ("src/build", None)])
+def test_leading_slash_anchors(rel, expected):
+    assert match(["/build"], rel, is_dir=True) is expected
+
+
+@pytest.mark.parametrize("rel, expected", [("docs/api", True), ("x/docs/api", None)])
+def test_inner_slash_anchors(rel, expected):
+    assert match(["docs/api"], rel, is_dir=True) is expected
+
+
+def test_unanchored_matches_at_any_depth():
+    assert match(["tmp"], "a/b/tmp") is True
+
+
+def test_dir_only():
+    assert match(["out/"], "out", is_dir=True) is True
+    assert match(["out/"], "out", is_dir=False) is None
+
+
+@pytest.mark.parametrize("pattern, rel, expected", [
+    ("**/logs", "logs", True),
+    ("**/logs", "a/b/logs", True),
+    ("a/**/b", "a/b", True),
+    ("a/**/b", "a/x/y/b", True),
+    ("a/**/b", "c/a/x/b", None),
+    ("a/**", "a/x/y", True),
+    ("a/*", "a/x/y", None),
+])
+def test_double_star(pattern, rel, expected):
+    assert match([pattern], rel) is expected
+
+
+def test_comments_and_escapes():
+    lines = ["# comment", r"\#hash", r"\!bang", "trail   "]
+    assert match(lines, "# comment") is None
+    assert match(lines, "#hash") is True
+    assert match(lines, "!bang") is True
+    assert match(lines, "trail") is True
+
+
+def test_nested_gitignore_negates_parent(tmp_path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".gitignore").write_text("*.gen\n")
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    (sub / ".gitignore").write_text("!keep.gen\n")
+    rules = IgnoreRules.for_dir(str(sub), [])
+    assert rules.ignored(str(sub / "x.gen"))
+    assert not rules.ignored(str(sub / "keep.gen"))
+    assert not rules.ignored(str(sub / "x.py"))
+
+
+def test_gitignore_disabled(tmp_path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".gitignore").write_text("*.gen\n")
+    assert not IgnoreRules.for_dir(str(tmp_path), [], use_gitignore=False).ignored(str(tmp_path / "x.gen"))
+    assert IgnoreRules.for_dir(str(tmp_path), ["*.gen"], use_gitignore=False).ignored(str(tmp_path / "x.gen"))
@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+import packager
+
+
+@pytest.fixture
+def src(tmp_path):
+    root = tmp_path / "src"
+    root.mkdir()
+    for i in range(6):
+        (root / f"f{i}.py").write_text(f"x = {i}\n" * 40)
+    return root
+
+
+def config(root, out, **extra):
+    cfg = {'out': out, 'fmt': "markdown", 'ign': [], 'root': root, 'rel_path': True,
+           'src': sorted(root.iterdir()), 'manifest': packager.manifest_path(out), 'delta': None}
+    cfg.update(extra)
+    return cfg
+
+
+def build(root, out, **extra):
+    cfg = config(root, out, **extra)
+    return cfg, packager.build_package(cfg)
+
+
+def test_manifest_records_every_file(src, tmp_path):
+    out = tmp_path / "out.md"
+    build(src, out)
+    rows = packager.load_manifest(packager.manifest_path(out))
+    assert sorted(rows) == sorted(str(p) for p in src.iterdir())
+    assert all(row[0] == os.path.basename(p) for p, row in rows.items())
+
+
+def test_delta_reports_changes_only(src, tmp_path):
+    out = tmp_path / "out.md"
+    build(src, out)
+    (src / "f1.py").write_text("changed\n")
+    (src / "f2.py").unlink()
+    (src / "new.py").write_text("y = 1\n")
+    st = os.stat(src / "f3.py")
+    os.utime(src / "f3.py", ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    cfg, _ = build(src, out, delta=packager.manifest_path(out))
+    report = cfg['report']
+    assert (report['added'], report['modified'], report['deleted']) == (1, 1, 1)
+    text = out.read_text(encoding="utf-8")
+    assert "new.py" in text and "f1.py" in text
+    assert "f0.py" not in text and "f3.py" not in text
+    assert cfg['deleted'] == ["f2.py"]
+    rows = packager.load_manifest(packager.manifest_path(out))
+    assert sorted(os.path.basename(p) for p in rows) == ["f0.py", "f1.py", "f3.py", "f4.py", "f5.py", "new.py"]
+
+
+def test_delta_without_manifest_is_full(src, tmp_path):
+    out = tmp_path / "out.md"
+    cfg, _ = build(src, out, delta=tmp_path / "missing.json")
+    assert cfg['report']['added'] == 6
+
+
+def shard_names(tmp_path):
+    return sorted(p.name for p in tmp_path.iterdir() if p.is_file())
+
+
+def test_shard_naming(src, tmp_path):
+    out = tmp_path / "out.md"
+    _, index = build(src, out, shard_bytes=400)
+    assert index == str(tmp_path / "out.index.json")
+    shards = json.loads((tmp_path / "out.index.json").read_text(encoding="utf-8"))["shards"]
+    assert [s["file"] for s in shards] == [f"out.part{i:03d}.md" for i in range(1, len(shards) + 1)]
+    assert len(shards) > 1
+    assert sorted(p for s in shards for p in s["paths"]) == sorted(p.name for p in src.iterdir())
+
+
+def test_stale_outputs_removed(src, tmp_path):
+    out = tmp_path / "out.md"
+    (tmp_path / "out.notes.txt").write_text("mine")
+    build(src, out, shard_bytes=300)
+    many = [n for n in shard_names(tmp_path) if ".part" in n]
+    build(src, out, shard_bytes=10 ** 6)
+    assert [n for n in shard_names(tmp_path) if ".part" in n] == ["out.part001.md"]
+    assert len(many) > 1
+    build(src, out)
+    assert shard_names(tmp_path) == ["out.manifest.json", "out.md", "out.notes.txt"]
+    build(src, out, shard_bytes=300)
+    assert "out.md" not in shard_names(tmp_path)
+    assert "out.index.json" in shard_names(tmp_path)
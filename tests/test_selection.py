@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+import packager
+from selection import CHECKED, PARTIAL, UNCHECKED, SelectionModel, SelectionStats
+
+TREE = {
+    "a/one.py": "1", "a/two.log": "22", "a/keep.log": "333",
+    "a/deep/x.py": "4444", "a/deep/skip/y.py": "55555",
+    "b/z.py": "666666", "b/node_modules/m.js": "7",
+    "top.txt": "88",
+}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".gitignore").write_text("*.log\n!keep.log\n")
+    for rel, text in TREE.items():
+        p = tmp_path / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text)
+    return tmp_path
+
+
+def files(root, *rels):
+    return sorted(os.path.join(str(root), *rel.split("/")) for rel in rels)
+
+
+def test_trie_states(tree):
+    sel = SelectionModel()
+    sel.set(tree / "a", True)
+    sel.set(tree / "a" / "deep" / "skip", False)
+    assert sel.is_selected(tree / "a" / "one.py")
+    assert not sel.is_selected(tree / "a" / "deep" / "skip" / "y.py")
+    assert not sel.is_selected(tree / "b")
+    assert sel.status(tree / "a") == PARTIAL
+    assert sel.status(tree / "a" / "deep" / "x.py") == CHECKED
+    assert sel.status(tree / "b") == UNCHECKED
+    assert sel.include_roots() == [str(tree / "a")]
+    assert sel.exclude_roots() == [str(tree / "a" / "deep" / "skip")]
+
+
+def test_set_back_to_inherited_prunes(tree):
+    sel = SelectionModel()
+    sel.set(tree / "a", True)
+    sel.set(tree / "a" / "one.py", False)
+    sel.set(tree / "a" / "one.py", True)
+    assert len(sel) == 1
+    sel.set(tree / "a", False)
+    assert not sel and len(sel) == 0
+
+
+def test_copy_keeps_rules(tree):
+    sel = SelectionModel()
+    sel.set(tree, True)
+    sel.set(tree / "b", False)
+    sel.set(tree / "b" / "z.py", True)
+    other = sel.copy()
+    assert list(other._rules()) == list(sel._rules())
+    other.set(tree, False)
+    assert sel.is_selected(tree / "top.txt")
+
+
+@pytest.mark.parametrize("gitignore", [True, False])
+def test_resolve_matches_trie(tree, gitignore):
+    sel = SelectionModel()
+    sel.set(tree / "a", True)
+    sel.set(tree / "a" / "deep" / "skip", False)
+    sel.set(tree / "b" / "z.py", True)
+    sel.set(tree / "top.txt", True)
+    ign = packager.parse_ignores("node_modules")
+    expected = files(tree, "a/one.py", "a/keep.log", "a/deep/x.py", "b/z.py", "top.txt")
+    if not gitignore: expected = sorted(expected + files(tree, "a/two.log"))
+    assert packager.resolve_selection(sel, ign, gitignore) == expected
+    assert sorted(map(str, packager.iter_selection(sel, ign, gitignore))) == expected
+    for p in expected: assert sel.is_selected(p)
+
+
+def test_stats_totals_match_resolve(tree):
+    sel = SelectionModel()
+    sel.set(tree, True)
+    sel.set(tree / "a" / "deep", False)
+    sel.set(tree / "a" / "deep" / "x.py", True)
+    ign = packager.parse_ignores("node_modules")
+    stats = SelectionStats()
+    stats.reset((tuple(ign), True))
+    count, size, pending = stats.totals(sel)
+    assert pending
+    for p in pending:
+        if os.path.isdir(p): stats.add_summary(packager.walk_summary(p, ign, True))
+        else: stats.note_file(p, os.path.getsize(p))
+    resolved = packager.resolve_selection(sel, ign, True, sizes=True)
+    count, size, pending = stats.totals(sel)
+    assert not pending
+    assert (count, size) == (len(resolved), sum(s for _, s in resolved))
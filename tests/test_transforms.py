@@ -0,0 +1,66 @@
+import pytest
+
+from transforms import strip_comments
+
+
+def strip(content, ext):
+    return strip_comments(content, ext, {})
+
+
+@pytest.mark.parametrize("ext", ["sh", "bash", "zsh"])
+def test_shell_keeps_special_parameters(ext):
+    src = "if [ $# -eq 0 ]; then echo ${#arr[@]} ${var#pre} ${var##*/}; fi # done\n"
+    assert strip(src, ext) == "if [ $# -eq 0 ]; then echo ${#arr[@]} ${var#pre} ${var##*/}; fi \n"
+
+
+def test_shell_comments_and_strings():
+    src = "#!/bin/sh\n# header\necho a#b \"# kept\" '# kept' # gone\n"
+    assert strip(src, "sh") == "#!/bin/sh\n\necho a#b \"# kept\" '# kept' \n"
+
+
+def test_shell_heredoc_untouched():
+    src = "cat <<EOF\n# not a comment\nEOF\necho x # gone\n"
+    assert strip(src, "sh") == "cat <<EOF\n# not a comment\nEOF\necho x \n"
+
+
+@pytest.mark.parametrize("ext", ["yaml", "yml"])
+def test_yaml_left_alone(ext):
+    src = "url: http://x.com/a#frag\nscript: |\n  echo hi # kept\n# comment\n"
+    assert strip(src, ext) == src
+
+
+def test_toml_inline_comment_needs_whitespace():
+    src = 'url = "http://x.com/a#frag"\ncolor = "#fff" # theme\nkey = a#b\n'
+    assert strip(src, "toml") == 'url = "http://x.com/a#frag"\ncolor = "#fff" \nkey = a#b\n'
+
+
+def test_ini_only_full_line_comments():
+    src = "# header\ncolor = #fff\n  # indented\n"
+    assert strip(src, "ini") == "\ncolor = #fff\n\n"
+
+
+def test_python_comments():
+    src = 's = "# kept"  # gone\n"""\n# kept\n"""\n'
+    assert strip(src, "py") == 's = "# kept"  \n"""\n# kept\n"""\n'
+
+
+@pytest.mark.parametrize("ext", ["js", "ts"])
+def test_js_regex_literals(ext):
+    src = "const re = /\\/\\//g; // gone\nif (/[/]/.test(s)) return /a\\/b/;\nx = a / b / c; // gone\n"
+    assert strip(src, ext) == "const re = /\\/\\//g; \nif (/[/]/.test(s)) return /a\\/b/;\nx = a / b / c; \n"
+
+
+def test_c_style_strings_and_blocks():
+    src = 'char *u = "http://x"; /* block\n */ int a; // line\n'
+    assert strip(src, "c") == 'char *u = "http://x";  int a; \n'
+
+
+def test_css_urls():
+    src = "a{background:url(http://example.com/x.png)} /* c */\n"
+    assert strip(src, "css") == "a{background:url(http://example.com/x.png)} \n"
+    src = "a{b:url(http://x/y.png); // note\n}\n"
+    assert strip(src, "scss") == "a{b:url(http://x/y.png); \n}\n"
+
+
+def test_unknown_extension_untouched():
+    assert strip("# x // y", "txt") == "# x // y"
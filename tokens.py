@@ -0,0 +1,45 @@
+import threading
+
+CHARS_PER_TOKEN = 4
+MIN_TRUNCATE_TOKENS = 256
+
+_exact = None
+_exact_lock = threading.Lock()
+
+
+def estimate(text):
+    n = len(text)
+    wide = (len(text.encode('utf-8')) - n) // 2
+    return (n - wide + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN + wide
+
+
+def estimate_bytes(nbytes):
+    return (nbytes + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def exact_counter():
+    global _exact
+    with _exact_lock:
+        if _exact is None:
+            try:
+                import tiktoken
+                enc = tiktoken.get_encoding("cl100k_base")
+                _exact = lambda text: len(enc.encode(text, disallowed_special=()))
+            except Exception:
+                _exact = False
+        return _exact or None
+
+
+def counter(exact=False):
+    if exact:
+        fn = exact_counter()
+        if fn is not None: return "cl100k", fn
+    return "est", estimate
+
+
+def truncate(text, limit, count=estimate):
+    total = count(text)
+    if total <= limit: return text
+    cut = text[:len(text) * limit // total]
+    cut = cut[:cut.rfind("\n") + 1] or cut
+    return f"{cut}…[truncated {total - count(cut)} tokens]…\n"
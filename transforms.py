@@ -0,0 +1,126 @@
+import os
+import re
+import threading
+
+DEFAULT_MAX_LINE = 500
+PROCESS_MIN_BYTES = 16 * 1024 * 1024
+BATCH_FILES = 64
+BATCH_BYTES = 4 * 1024 * 1024
+
+_BLANK_LINES = re.compile(r'\n\s*\n')
+_TRAILING_WS = re.compile(r'[ \t]+(?=\r?\n|\Z)')
+
+_STR = r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\''
+_JS_REGEX = r'(?:[(,=:\[!&|?{};]|\breturn)\s*/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[a-z]*'
+_HEREDOC = r'<<[-~]?\s*[\'"]?(\w+)[\'"]?[^\n]*\n[\s\S]*?\n[ \t]*\2[ \t]*(?=\n|$)'
+_C_STYLE = re.compile(r'(`(?:\\.|[^`\\])*`|' + _STR + r')|//[^\n]*|/\*.*?\*/', re.S)
+_JS_STYLE = re.compile(r'(`(?:\\.|[^`\\])*`|' + _STR + '|' + _JS_REGEX + r')|//[^\n]*|/\*.*?\*/', re.S)
+_CSS = re.compile(r'(' + _STR + r')|/\*.*?\*/', re.S)
+_SCSS = re.compile(r'(url\([^)\n]*\)|' + _STR + r')|//[^\n]*|/\*.*?\*/', re.S)
+_HASH = re.compile(r'("""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|' + _STR + r')|#[^\n]*')
+_SHELL = re.compile(r'(' + _HEREDOC + r'|"(?:\\.|[^"\\])*"|\'[^\']*\')|(?:(?<=\s)|^)#[^\n]*', re.M)
+_INLINE_HASH = re.compile(r'("""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|' + _STR + r')|(?:(?<=\s)|^)#[^\n]*', re.M)
+_LINE_HASH = re.compile(r'()^[ \t]*#[^\n]*', re.M)
+_DASH = re.compile(r'(' + _STR + r')|--[^\n]*')
+_MARKUP = re.compile(r'<!--.*?-->', re.S)
+
+COMMENT_STYLES = {
+    _C_STYLE: ("c", "h", "cc", "cpp", "hpp", "cxx", "cs", "java", "go", "rs", "kt", "kts", "swift", "scala", "dart",
+               "php", "groovy"),
+    _JS_STYLE: ("js", "jsx", "mjs", "cjs", "ts", "tsx"),
+    _CSS: ("css",),
+    _SCSS: ("scss", "less"),
+    _HASH: ("py", "pyw"),
+    _SHELL: ("sh", "bash", "zsh", "rb"),
+    _INLINE_HASH: ("r", "toml", "cmake", "mk", "tf"),
+    _LINE_HASH: ("cfg", "ini", "conf", "dockerfile"),
+    _DASH: ("sql", "lua", "hs"),
+    _MARKUP: ("html", "htm", "xml", "vue", "svelte", "xhtml"),
+}
+_STYLE_BY_EXT = {ext: rx for rx, exts in COMMENT_STYLES.items() for ext in exts}
+
+
+def compress(content, ext, opts):
+    return _BLANK_LINES.sub('\n', content)
+
+
+def strip_trailing(content, ext, opts):
+    return _TRAILING_WS.sub('', content)
+
+
+def strip_comments(content, ext, opts):
+    rx = _STYLE_BY_EXT.get(ext.lower())
+    if rx is None: return content
+    if rx is _MARKUP: return rx.sub('', content)
+    shebang = ""
+    if rx in (_HASH, _SHELL, _INLINE_HASH) and content.startswith("#!"):
+        shebang, _, content = content.partition("\n")
+        shebang += "\n"
+    return shebang + rx.sub(lambda m: m.group(1) or "", content)
+
+
+def truncate_lines(content, ext, opts):
+    limit = opts.get("max_line", DEFAULT_MAX_LINE)
+    if not any(len(line) > limit for line in content.split("\n")): return content
+    return "\n".join(line if len(line) <= limit else f"{line[:limit]} …[+{len(line) - limit} chars]"
+                     for line in content.split("\n"))
+
+
+TRANSFORMS = {
+    "strip_comments": strip_comments,
+    "truncate_lines": truncate_lines,
+    "strip_trailing": strip_trailing,
+    "compress": compress,
+}
+
+
+def pipeline_for(cfg):
+    names = list(cfg.get('transforms') or [])
+    if cfg.get('compress') and "compress" not in names: names.append("compress")
+    return tuple(n for n in TRANSFORMS if n in names)
+
+
+def pipeline_key(names, opts):
+    if not names: return ""
+    if "truncate_lines" not in names: opts = {}
+    extra = ",".join(f"{k}={v}" for k, v in sorted((opts or {}).items()))
+    return "+".join(names) + (f";{extra}" if extra else "")
+
+
+def apply(content, ext, names, opts=None):
+    opts = opts or {}
+    for name in names:
+        content = TRANSFORMS[name](content, ext, opts)
+    return content
+
+
+def apply_batch(items, names, opts=None):
+    return [apply(content, ext, names, opts) for content, ext in items]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 2)
+        return _pool
+
+
+def use_processes(names, total_bytes):
+    return bool(names) and (os.cpu_count() or 1) > 1 and total_bytes >= PROCESS_MIN_BYTES
+
+
+def batches(entries):
+    batch, size = [], 0
+    for e in entries:
+        if batch and (len(batch) >= BATCH_FILES or size + e['size'] > BATCH_BYTES):
+            yield batch
+            batch, size = [], 0
+        batch.append(e)
+        size += e['size']
+    if batch: yield batch
@@ -0,0 +1,93 @@
+import os
+import time
+
+from scheduler import get_scheduler, BACKGROUND
+
+BATCH_ITEMS = 2000
+BATCH_INTERVAL = 0.1
+
+
+def scan_one(dirpath, rules, load_local=True, skip=None, sizes=False):
+    try:
+        with os.scandir(dirpath) as it:
+            entries = list(it)
+    except OSError:
+        return [], [], rules
+    if load_local: rules = rules.child(dirpath, [e.name for e in entries])
+    items, subdirs = [], []
+    for e in entries:
+        try: is_dir = e.is_dir() or (None if not e.is_file() else False)
+        except OSError: is_dir = None
+        if rules.ignored(e.path, bool(is_dir)): continue
+        if skip and os.path.normcase(e.path) in skip: continue
+        if not sizes:
+            items.append((e.path, is_dir))
+        elif is_dir is False:
+            try: items.append((e.path, e.stat().st_size))
+            except OSError: pass
+        if is_dir:
+            try: is_link = e.is_symlink()
+            except OSError: is_link = False
+            if not is_link: subdirs.append(e.path)
+    return items, subdirs, rules
+
+
+class _Batcher:
+    def __init__(self, on_batch):
+        self.on_batch = on_batch
+        self.items = []
+        self.last_emit = time.monotonic()
+
+    def add(self, items, final):
+        if self.on_batch is None: return
+        self.items.extend(items)
+        now = time.monotonic()
+        if self.items and (len(self.items) >= BATCH_ITEMS or now - self.last_emit >= BATCH_INTERVAL or final):
+            self.on_batch(self.items)
+            self.items, self.last_emit = [], now
+
+
+def parallel_walk(root, rules, on_batch=None, files_only=False, skip=None, sizes=False, priority=BACKGROUND):
+    root = str(root)
+    sched = get_scheduler()
+    if sizes: return _walk_sizes(root, rules, sched, skip, priority, _Batcher(on_batch))
+    found = set() if files_only else {root}
+    batch = _Batcher(on_batch)
+    batch.add(list(found), False)
+    pending = {sched.submit(scan_one, root, rules, False, skip, priority=priority)}
+    while pending:
+        done, pending = sched.wait_any(pending)
+        for fut in done:
+            items, subdirs, rules = fut.result()
+            items = [p for p, is_dir in items if not files_only or is_dir is False]
+            found.update(items)
+            batch.add(items, False)
+            for d in subdirs:
+                pending.add(sched.submit(scan_one, d, rules, True, skip, priority=priority))
+        batch.add((), not pending)
+    return found
+
+
+def iter_files(root, rules, skip=None, check=None):
+    stack = [(str(root), rules, False)]
+    while stack:
+        if check: check()
+        d, r, load = stack.pop()
+        items, subdirs, r = scan_one(d, r, load, skip)
+        yield from sorted(p for p, is_dir in items if is_dir is False)
+        stack.extend((s, r, True) for s in sorted(subdirs, reverse=True))
+
+
+def _walk_sizes(root, rules, sched, skip, priority, batch):
+    found = {}
+    pending = {sched.submit(scan_one, root, rules, False, skip, True, priority=priority)}
+    while pending:
+        done, pending = sched.wait_any(pending)
+        for fut in done:
+            items, subdirs, rules = fut.result()
+            found.update(items)
+            batch.add(items, False)
+            for d in subdirs:
+                pending.add(sched.submit(scan_one, d, rules, True, skip, True, priority=priority))
+        batch.add((), not pending)
+    return found
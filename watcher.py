@@ -0,0 +1,196 @@
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import threading
+
+from ignore_rules import IgnoreRules
+from walker import scan_one
+
+DEBOUNCE = 0.25
+MAX_DELAY = 1.0
+POLL_INTERVAL = 0.5
+
+IN_MODIFY, IN_CLOSE_WRITE = 0x2, 0x8
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+IN_DELETE_SELF, IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR = 0x400, 0x4000, 0x8000, 0x40000000
+STRUCTURE = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | STRUCTURE | IN_DELETE_SELF
+_EVENT = struct.Struct("iIII")
+
+
+def _walk_dirs(root, rules, load_local=False):
+    stack = [(root, rules, load_local)]
+    while stack:
+        d, r, load = stack.pop()
+        items, subdirs, r = scan_one(d, r, load)
+        yield d, r, items
+        stack.extend((s, r, True) for s in subdirs)
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return None
+
+
+def watch_roots(paths):
+    roots = sorted({os.path.abspath(p if os.path.isdir(p) else os.path.dirname(p)) for p in map(str, paths)})
+    out = []
+    for r in roots:
+        if not any(r == o or r.startswith(os.path.join(o, "")) for o in out): out.append(r)
+    return out
+
+
+class InotifyWatcher:
+    def __init__(self, roots, ignores, gitignore=True):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0: raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._wd = {}
+        try:
+            for root in roots:
+                self._add_tree(str(root), IgnoreRules.for_dir(str(root), ignores, gitignore))
+        except OSError:
+            self.close()
+            raise
+
+    def _add_tree(self, path, rules, load_local=False):
+        for d, r, _ in _walk_dirs(path, rules, load_local):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(d), WATCH_MASK)
+            if wd < 0: raise OSError(ctypes.get_errno(), f"inotify_add_watch {d}")
+            self._wd[wd] = (d, r)
+
+    def poll(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]: return []
+        try: data = os.read(self.fd, 1 << 16)
+        except BlockingIOError: return []
+        events, pos = [], 0
+        while pos < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, pos)
+            name = data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b"\0")
+            pos += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, True))
+                continue
+            if mask & IN_IGNORED:
+                self._wd.pop(wd, None)
+                continue
+            d, rules = self._wd.get(wd, (None, None))
+            if d is None: continue
+            if not name:
+                events.append((d, True))
+                continue
+            path = os.path.join(d, os.fsdecode(name))
+            is_dir = bool(mask & IN_ISDIR)
+            if rules.ignored(path, is_dir): continue
+            if is_dir and mask & (IN_CREATE | IN_MOVED_TO):
+                try: self._add_tree(path, rules, True)
+                except OSError: pass
+            events.append((path, bool(mask & STRUCTURE)))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    def __init__(self, roots, ignores, gitignore=True, interval=POLL_INTERVAL):
+        self.interval = interval
+        self._dirs = {}
+        self._files = {}
+        for root in roots:
+            self._add_tree(str(root), IgnoreRules.for_dir(str(root), ignores, gitignore))
+
+    def _add_tree(self, path, rules, load_local=False):
+        for d, r, items in _walk_dirs(path, rules, load_local):
+            self._dirs[d] = (r, _stamp(d))
+            for p, is_dir in items:
+                if is_dir is False and p not in self._files: self._files[p] = _stamp(p)
+
+    def poll(self, timeout):
+        time.sleep(min(self.interval, timeout))
+        events = []
+        for p, old in list(self._files.items()):
+            st = _stamp(p)
+            if st == old: continue
+            if st is None: del self._files[p]
+            else: self._files[p] = st
+            events.append((p, st is None))
+        for d, (rules, old) in list(self._dirs.items()):
+            st = _stamp(d)
+            if st == old or d not in self._dirs: continue
+            if st is None:
+                prefix = os.path.join(d, "")
+                for p in [p for p in self._dirs if p == d or p.startswith(prefix)]: del self._dirs[p]
+                events.append((d, True))
+                continue
+            self._dirs[d] = (rules, st)
+            items, subdirs, _ = scan_one(d, rules, False)
+            for p, is_dir in items:
+                if is_dir is False and p not in self._files:
+                    self._files[p] = _stamp(p)
+                    events.append((p, True))
+            for s in subdirs:
+                if s not in self._dirs:
+                    self._add_tree(s, rules, True)
+                    events.append((s, True))
+        return events
+
+    def close(self): pass
+
+
+def make_watcher(roots, ignores, gitignore=True, polling=False):
+    if not polling and sys.platform.startswith("linux"):
+        try: return InotifyWatcher(roots, ignores, gitignore)
+        except (OSError, AttributeError): pass
+    return PollingWatcher(roots, ignores, gitignore)
+
+
+class WatchSession:
+    def __init__(self, roots, ignores, gitignore, on_change, polling=False, debounce=DEBOUNCE, max_delay=MAX_DELAY,
+                 exclude=None):
+        self.roots, self.ignores, self.gitignore, self.polling = list(roots), list(ignores), gitignore, polling
+        self.watcher = None
+        self.on_change = on_change
+        self.exclude = exclude or (lambda p: False)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._stop = threading.Event()
+        self.ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.run, name="watch", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self, timeout):
+        return [(p, s) for p, s in self.watcher.poll(timeout) if p is None or not self.exclude(p)]
+
+    def run(self):
+        try:
+            self.watcher = make_watcher(self.roots, self.ignores, self.gitignore, self.polling)
+        finally:
+            self.ready.set()
+        try:
+            while not self._stop.is_set():
+                events = self._poll(0.5)
+                if not events: continue
+                first = time.monotonic()
+                while not self._stop.is_set():
+                    remaining = min(self.debounce, first + self.max_delay - time.monotonic())
+                    if remaining <= 0: break
+                    more = self._poll(remaining)
+                    if not more: break
+                    events += more
+                if not self._stop.is_set(): self.on_change(events)
+        finally:
+            self.watcher.close()
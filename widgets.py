@@ -1,15 +1,25 @@
+import sys
 import tkinter as tk
 from tkinter import ttk
 import customtkinter as ctk
 from pathlib import Path
 from theme import Material3
+from selection import SelectionModel, CHECKED
+
+ROW_HEIGHT = 36
+ROW_MARGIN = 2
+SORT_KEYS = {
+    "name": lambda x: x['name'].lower(),
+    "size": lambda x: x.get('size', 0),
+    "date": lambda x: x.get('mtime', 0)
+}
 
 class ModernFileTree(ctk.CTkFrame):
     def __init__(self, master, navigate_cb, toggle_cb, **kwargs):
         super().__init__(master, **kwargs)
         self.navigate_cb = navigate_cb
         self.toggle_cb = toggle_cb 
-        self.selection_map = set()
+        self.selection = SelectionModel()
         
         self.style = ttk.Style()
         self.style.theme_use("clam")
@@ -21,7 +31,7 @@ class ModernFileTree(ctk.CTkFrame):
         self.style.layout("Custom.Treeview", [('Custom.Treeview.treearea', {'sticky': 'nswe'})])
         self.style.configure("Custom.Treeview", 
                            background=bg, foreground=fg, fieldbackground=bg,
-                           borderwidth=0, rowheight=36,
+                           borderwidth=0, rowheight=ROW_HEIGHT,
                            font=("Microsoft YaHei UI", 11))
         
         self.style.map("Custom.Treeview", 
@@ -33,19 +43,20 @@ class ModernFileTree(ctk.CTkFrame):
                            background=Material3.get("surface"), 
                            foreground=fg, borderwidth=0, relief="flat")
 
+        self._sort_key = None
+        self._sort_reverse = False
         self.tree = ttk.Treeview(self, columns=("size", "date"), 
                                show="tree headings", style="Custom.Treeview", selectmode="browse")
         
-        self.tree.heading("#0", text="  文件名", anchor="w")
-        self.tree.heading("size", text="大小  ", anchor="e")
-        self.tree.heading("date", text="修改日期  ", anchor="e")
+        self.headings = {"name": ("#0", "文件名", "w"), "size": ("size", "大小", "e"), "date": ("date", "修改日期", "e")}
+        for key, (col, text, anchor) in self.headings.items():
+            self.tree.heading(col, text=self._heading_text(key), anchor=anchor, command=lambda k=key: self.sort_by(k))
         
         self.tree.column("#0", minwidth=300, stretch=True) 
         self.tree.column("size", width=100, anchor="e", stretch=False)
         self.tree.column("date", width=140, anchor="e", stretch=False)
 
-        self.scroll_y = ctk.CTkScrollbar(self, command=self.tree.yview, width=12)
-        self.tree.configure(yscrollcommand=self.scroll_y.set)
+        self.scroll_y = ctk.CTkScrollbar(self, command=self._on_scroll, width=12)
 
         self.tree.grid(row=0, column=0, sticky="nsew")
         self.scroll_y.grid(row=0, column=1, sticky="ns")
@@ -54,40 +65,85 @@ class ModernFileTree(ctk.CTkFrame):
 
         self.tree.bind("<Double-1>", self.on_double_click)
         self.tree.bind("<Button-1>", self.on_single_click)
+        self.tree.bind("<Configure>", lambda e: self._render())
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(seq, self._on_wheel)
 
         self.icons = {
             "checked": "☑",
             "unchecked": "☐",
+            "partial": "◩",
             "folder": "📁",
             "file": "📄"
         }
-        self.current_items_map = {} 
-        self._populate_queue = []
+        self.current_items_map = {}
+        self.rows = []
+        self._offset = 0
 
     def populate(self, items):
-        self.tree.delete(*self.tree.get_children())
-        self.current_items_map = {str(item['path']): item for item in items}
-        self._populate_queue = items
-        self.after(1, self._process_batch_insert)
-
-    def _process_batch_insert(self):
-        batch_size = 60 
-        if not self._populate_queue:
-            return
-            
-        batch = self._populate_queue[:batch_size]
-        self._populate_queue = self._populate_queue[batch_size:]
-        
-        for item in batch:
-            path_str = str(item['path'])
-            is_checked = path_str in self.selection_map
-            self._insert_item(item, is_checked)
-            
-        if self._populate_queue:
-            self.after(5, self._process_batch_insert)
-
-    def _insert_item(self, item, checked):
-        check_icon = self.icons["checked"] if checked else self.icons["unchecked"]
+        self.rows = list(items)
+        self.current_items_map = {str(item['path']): item for item in self.rows}
+        self._apply_sort()
+        self._offset = 0
+        self._render()
+
+    def _page_size(self):
+        h = self.tree.winfo_height()
+        if h <= 1: return 20
+        return max(1, h // ROW_HEIGHT - 1)
+
+    def _render(self):
+        n, page = len(self.rows), self._page_size()
+        self._offset = max(0, min(self._offset, n - page))
+        window = self.rows[self._offset:self._offset + page + ROW_MARGIN]
+        ids = [str(item['path']) for item in window]
+        if list(self.tree.get_children()) != ids:
+            self.tree.delete(*self.tree.get_children())
+            for item in window:
+                self._insert_item(item, self.selection.status(str(item['path'])))
+        else:
+            for item_id in ids: self.refresh_row_visual(item_id)
+        if n: self.scroll_y.set(self._offset / n, min(1.0, (self._offset + page) / n))
+        else: self.scroll_y.set(0.0, 1.0)
+
+    def _on_scroll(self, action, value, unit=None):
+        if action == "moveto":
+            self._offset = int(float(value) * len(self.rows))
+        elif unit == "pages":
+            self._offset += int(value) * self._page_size()
+        else:
+            self._offset += int(value)
+        self._render()
+
+    def _on_wheel(self, event):
+        if sys.platform.startswith("win"): delta = -int(event.delta / 40)
+        elif sys.platform == "darwin": delta = -event.delta
+        else: delta = -3 if event.num == 4 else 3
+        self._on_scroll("scroll", delta, "units")
+        return "break"
+
+    def sort_by(self, key):
+        self._sort_reverse = not self._sort_reverse if self._sort_key == key else False
+        self._sort_key = key
+        for k, (col, text, anchor) in self.headings.items():
+            self.tree.heading(col, text=self._heading_text(k))
+        self._apply_sort()
+        self._offset = 0
+        self._render()
+
+    def _heading_text(self, key):
+        col, text, anchor = self.headings[key]
+        if key == self._sort_key: text += " ▼" if self._sort_reverse else " ▲"
+        return f"  {text}" if anchor == "w" else f"{text}  "
+
+    def _apply_sort(self):
+        if self._sort_key is None: return
+        keyfunc = SORT_KEYS[self._sort_key]
+        self.rows.sort(key=keyfunc, reverse=self._sort_reverse)
+        self.rows.sort(key=lambda x: not x['is_dir'])
+
+    def _insert_item(self, item, status):
+        check_icon = self.icons[status]
         type_icon = self.icons["folder"] if item['is_dir'] else self.icons["file"]
         display_text = f"  {check_icon}   {type_icon}   {item['name']}"
         tags = ("dir",) if item['is_dir'] else ("file",)
@@ -95,6 +151,16 @@ class ModernFileTree(ctk.CTkFrame):
         self.tree.insert("", "end", iid=str(item['path']), text=display_text, 
                          values=(item['size_str'], item['date']), tags=tags)
 
+    def patch(self, added, removed, changed):
+        gone = set(removed)
+        for path_str in gone: self.current_items_map.pop(path_str, None)
+        for item in list(added) + list(changed): self.current_items_map[str(item['path'])] = item
+        rows = [self.current_items_map[str(x['path'])] for x in self.rows if str(x['path']) not in gone]
+        self.rows = rows + list(added)
+        self._apply_sort()
+        self.tree.delete(*self.tree.get_children())
+        self._render()
+
     def on_single_click(self, event):
         region = self.tree.identify_region(event.x, event.y)
         if region == "tree":
@@ -117,13 +183,8 @@ class ModernFileTree(ctk.CTkFrame):
         item = self.current_items_map.get(item_id)
         is_dir = item['is_dir'] if item else Path(item_id).is_dir()
         
-        is_selecting = item_id not in self.selection_map
-        
-        if is_selecting:
-            self.selection_map.add(item_id)
-        else:
-            self.selection_map.discard(item_id)
-            
+        is_selecting = self.selection.status(item_id) != CHECKED
+        self.selection.set(item_id, is_selecting)
         self.refresh_row_visual(item_id)
         self.toggle_cb(item_id, is_selecting, recursive=is_dir)
 
@@ -131,32 +192,24 @@ class ModernFileTree(ctk.CTkFrame):
         if not self.tree.exists(item_id): return
         old_text = self.tree.item(item_id, "text")
         
-        target_icon = self.icons["checked"] if item_id in self.selection_map else self.icons["unchecked"]
+        target_icon = self.icons[self.selection.status(item_id)]
         
-        if self.icons["checked"] in old_text and target_icon == self.icons["unchecked"]:
-            new_text = old_text.replace(self.icons["checked"], self.icons["unchecked"], 1)
-            self.tree.item(item_id, text=new_text)
-        elif self.icons["unchecked"] in old_text and target_icon == self.icons["checked"]:
-            new_text = old_text.replace(self.icons["unchecked"], self.icons["checked"], 1)
-            self.tree.item(item_id, text=new_text)
+        for key in ("checked", "unchecked", "partial"):
+            icon = self.icons[key]
+            if icon in old_text:
+                if icon != target_icon:
+                    self.tree.item(item_id, text=old_text.replace(icon, target_icon, 1))
+                break
 
     def clear_selection(self):
-        visible_ids = self.tree.get_children()
-        self.selection_map.clear()
-        for item_id in visible_ids:
-            self.refresh_row_visual(item_id)
+        self.selection.clear()
+        self.bulk_update_visuals()
         self.toggle_cb(None, False, False)
 
     def remove_specific(self, path_str):
-        if path_str in self.selection_map:
-            self.selection_map.remove(path_str)
-            if self.tree.exists(path_str):
-                self.refresh_row_visual(path_str)
-            
-            if Path(path_str).is_dir():
-                self.toggle_cb(path_str, False, recursive=True)
-            else:
-                self.toggle_cb(path_str, False, recursive=False)
+        self.selection.set(path_str, False)
+        self.bulk_update_visuals()
+        self.toggle_cb(path_str, False, recursive=Path(path_str).is_dir())
 
     def bulk_update_visuals(self, affected_items=None):
         current_visible_ids = set(self.tree.get_children())